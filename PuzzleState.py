@@ -1,15 +1,137 @@
+_goal_boards = {}
+_manhattan_tables = {}
+_neighbour_tables = {}
+
+def tile_bits(n):
+    """
+    Number of bits used to store one tile of an n*n board.
+    4 bits are enough for n <= 4, larger boards use wider fields.
+    """
+    return max(4, (n*n - 1).bit_length())
+
+def encode_config(config, n):
+    """
+    Packs a board configuration into one integer, tile i is stored at bits [i*w, (i+1)*w).
+    :param config->List : board configuration
+    :param n->int : Size of the board
+    :return int
+    """
+    w = tile_bits(n)
+    board = 0
+    for i, value in enumerate(config):
+        board |= value << (i*w)
+    return board
+
+def decode_board(board, n):
+    """
+    Unpacks an integer produced by encode_config back into a configuration list.
+    :param board->int : packed board
+    :param n->int : Size of the board
+    :return List
+    """
+    w = tile_bits(n)
+    mask = (1 << w) - 1
+    return [(board >> (i*w)) & mask for i in range(n*n)]
+
+def goal_board(n):
+    """packed encoding of the goal state [0,1,...,n*n-1]"""
+    try:
+        return _goal_boards[n]
+    except KeyError:
+        _goal_boards[n] = encode_config(range(n*n), n)
+        return _goal_boards[n]
+
+def manhattan_table(n):
+    """
+    Table of manhattan distances, table[idx][value] is the distance of tile value at index idx.
+    Built once per board size.
+    """
+    try:
+        return _manhattan_tables[n]
+    except KeyError:
+        _manhattan_tables[n] = [[calculate_manhattan_dist(idx, value, n) if value != 0 else 0
+                                 for value in range(n*n)] for idx in range(n*n)]
+        return _manhattan_tables[n]
+
+def neighbour_table(n):
+    """
+    Moves available to the blank at every index, table[blank] lists
+    (index of the tile the blank swaps with, action) in the order UDLR.
+    Built once per board size.
+    """
+    try:
+        return _neighbour_tables[n]
+    except KeyError:
+        pass
+    table = []
+    for blank in range(n*n):
+        row, col = blank//n, blank%n
+        moves = ((blank - n, row > 0, "Up"), (blank + n, row < n - 1, "Down"),
+                 (blank - 1, col > 0, "Left"), (blank + 1, col < n - 1, "Right"))
+        table.append(tuple((target, action) for target, legal, action in moves if legal))
+    _neighbour_tables[n] = table
+    return table
+
+
+class ManhattanHeuristic(object):
+    """
+        Sum of the manhattan distances of all tiles.
+
+        A heuristic provides evaluate() to score a board from scratch and
+        update() to derive the score of a child from its parent's score
+        after a single tile moved.
+    """
+    name = "manhattan"
+
+    def evaluate(self, config, n):
+        """
+        :param config->List : board configuration
+        :param n->int : Size of the board
+        :return int
+        """
+        return calculate_heuristic(config, n)
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        """
+        :param h->int : heuristic value of the parent
+        :param board->int : packed board of the child
+        :param n->int : Size of the board
+        :param tile->int : the tile that moved
+        :param old_index->int : index of the tile in the parent
+        :param new_index->int : index of the tile in the child
+        :return int
+        """
+        table = manhattan_table(n)
+        return h - table[old_index][tile] + table[new_index][tile]
+
+manhattan = ManhattanHeuristic()
+
+
 class PuzzleState(object):
     """
         The PuzzleState stores a board configuration and implements
         movement instructions to generate valid children.
+
+        The board is kept packed into a single integer (see encode_config),
+        hashing, equality and moves work on that integer directly.
+        The heuristic h is computed once when a state is created: fully for
+        the initial state, incrementally from the parent for children.
     """
-    def __init__(self, config, n, parent=None, action="Initial", cost=0):
+    __slots__ = ('n', 'cost', 'parent', 'action', 'board', 'blank', 'children', 'h', 'sort_key', 'heuristic')
+
+    heap_order = {'Initial' : -1, 'Up' : 0, 'Down' : 1, 'Left' : 2, 'Right' : 3 }
+
+    # the move that undoes each move
+    inverse_action = {'Initial' : None, 'Up' : 'Down', 'Down' : 'Up', 'Left' : 'Right', 'Right' : 'Left' }
+
+    def __init__(self, config, n, parent=None, action="Initial", cost=0, heuristic=manhattan):
         """
         :param config->List : Represents the n*n board, for e.g. [0,1,2,3,4,5,6,7,8] represents the goal state.
         :param n->int : Size of the board
         :param parent->PuzzleState
         :param action->string
         :param cost->int
+        :param heuristic : heuristic used to estimate the remaining cost, see ManhattanHeuristic
         """
         if n*n != len(config) or n < 2:
             raise Exception("The length of config is not correct!")
@@ -20,74 +142,105 @@ class PuzzleState(object):
         self.cost     = cost
         self.parent   = parent
         self.action   = action
-        self.config   = config
+        self.board    = encode_config(config, n)
         self.children = []
-        
-        self.heap_order = {'Up' : 0, 'Down' : 1, 'Left' : 2, 'Right' : 3 }
 
-        # Get the index and (row, col) of empty block
-        self.blank_index = config.index(0)//n , config.index(0)%n
+        # Get the index of empty block
+        self.blank    = list(config).index(0)
+
+        self.heuristic = heuristic
+        self.h         = heuristic.evaluate(config, n)
+        self.sort_key  = (cost + self.h, self.heap_order[action])
+
+    @classmethod
+    def from_board(cls, board, n, blank, h, heuristic, parent=None, action="Initial", cost=0):
+        """
+        Builds a state straight from a packed board, without validation.
+        :param board->int : packed board, see encode_config
+        :param n->int : Size of the board
+        :param blank->int : index of the empty block
+        :param h->int : heuristic value of the board
+        :param heuristic : heuristic that produced h
+        """
+        state = cls.__new__(cls)
+        state.n        = n
+        state.cost     = cost
+        state.parent   = parent
+        state.action   = action
+        state.board    = board
+        state.blank    = blank
+        state.children = []
+        state.h        = h
+        state.sort_key = (cost + h, cls.heap_order[action])
+        state.heuristic = heuristic
+        return state
+
+    @property
+    def config(self):
+        """the board as a list, e.g. [0,1,2,3,4,5,6,7,8]"""
+        return decode_board(self.board, self.n)
+
+    @property
+    def blank_index(self):
+        """(row, col) of the empty block"""
+        return self.blank//self.n , self.blank%self.n
+
+    def __hash__(self):
+        return hash(self.board)
+
+    def __eq__(self, other):
+        if not isinstance(other, PuzzleState):
+            return NotImplemented
+        return self.n == other.n and self.board == other.board
+
+    def __ne__(self, other):
+        if not isinstance(other, PuzzleState):
+            return NotImplemented
+        return self.n != other.n or self.board != other.board
 
     def __lt__(self, other):
-        return (calculate_total_cost(self), self.heap_order[self.action]) < (calculate_total_cost(other), other.heap_order[other.action])
+        return self.sort_key < other.sort_key
+
+    def slide(self, target, action):
+        """
+        Moves the tile at index target into the empty block.
+        :param target->int : index of the tile next to the blank
+        :param action->string : name of the move
+        :return a PuzzleState with the new configuration
+        """
+        w = tile_bits(self.n)
+        tile = (self.board >> (target*w)) & ((1 << w) - 1)
+        board = self.board - (tile << (target*w)) + (tile << (self.blank*w))
+
+        h = self.heuristic.update(self.h, board, self.n, tile, target, self.blank)
+
+        return PuzzleState.from_board(board, self.n, target, h, self.heuristic, self, action, self.cost + 1)
 
     def move_up(self):
-        """ 
+        """
         Moves the blank tile one row up.
         :return a PuzzleState with the new configuration
         """
-        row,col = self.blank_index
-        row_new, col_new = row-1, col
-        
-        if row_new >= 0:        
-            
-            new_config = list(self.config)
-            
-            #swap values in puzzle
-            new_config[col+row*self.n] = new_config[col_new+row_new*self.n]
-            new_config[col_new+row_new*self.n] = 0
-            
-            return PuzzleState(new_config, self.n, self, action = "Up", cost = self.cost + 1)
-        
+        if self.blank >= self.n:
+            return self.slide(self.blank - self.n, "Up")
         return None
 
-      
     def move_down(self):
         """
         Moves the blank tile one row down.
         :return a PuzzleState with the new configuration
         """
-        row,col = self.blank_index
-        row_new, col_new = row+1, col
-
-        if row_new < self.n:        
-            new_config = list(self.config)
-          
-            #swap values in puzzle
-            new_config[col+row*self.n] = new_config[col_new+row_new*self.n]
-            new_config[col_new+row_new*self.n] = 0
-
-            return PuzzleState(new_config, self.n, self, action = "Down", cost = self.cost + 1)
-        
+        if self.blank < self.n*(self.n - 1):
+            return self.slide(self.blank + self.n, "Down")
         return None
-      
+
     def move_left(self):
         """
         Moves the blank tile one column to the left.
         :return a PuzzleState with the new configuration
         """
-        row,col = self.blank_index
-        row_new, col_new = row, col-1
-        
-        if col_new >= 0:        
-            new_config = list(self.config)
-       
-            #swap values in puzzle
-            new_config[col+row*self.n] = new_config[col_new+row_new*self.n]
-            new_config[col_new+row_new*self.n] = 0
-
-            return PuzzleState(new_config, self.n, self, action = "Left", cost = self.cost + 1)
-        
+        if self.blank % self.n > 0:
+            return self.slide(self.blank - 1, "Left")
         return None
 
     def move_right(self):
@@ -95,51 +248,60 @@ class PuzzleState(object):
         Moves the blank tile one column to the right.
         :return a PuzzleState with the new configuration
         """
-        row,col = self.blank_index
-        row_new, col_new = row, col+1
-        
-        if col_new < self.n:        
-            new_config = list(self.config)
-      
-            #swap values in puzzle
-            new_config[col+row*self.n] = new_config[col_new+row_new*self.n]
-            new_config[col_new+row_new*self.n] = 0
-            
-
-            return PuzzleState(new_config, self.n, self, action = "Right", cost = self.cost + 1)
-        
+        if self.blank % self.n < self.n - 1:
+            return self.slide(self.blank + 1, "Right")
         return None
 
+    def successors(self, prune=False):
+        """
+        Generate the children of this node without storing them, in order of UDLR.
+        :param prune->bool : leave out the move that undoes the move to this node
+        """
+        n = self.n
+        inverse = self.inverse_action[self.action] if prune else None
+
+        # slide() inlined, this is the innermost loop of every engine
+        w = tile_bits(n)
+        mask = (1 << w) - 1
+        board, blank, h, heuristic, cost = self.board, self.blank, self.h, self.heuristic, self.cost + 1
+        children = []
+        for target, action in neighbour_table(n)[blank]:
+            if action == inverse:
+                continue
+            tile = (board >> (target*w)) & mask
+            child = board - (tile << (target*w)) + (tile << (blank*w))
+            children.append(PuzzleState.from_board(child, n, target, heuristic.update(h, child, n, tile, target, blank),
+                                                   heuristic, self, action, cost))
+        return children
+
     def expand(self):
         """ Generate the children of this node """
-        
+
         # Node has already been expanded
         if len(self.children) != 0:
             return self.children
-        
-        # Add child nodes in order of UDLR
-        children = [
-            self.move_up(),
-            self.move_down(),
-            self.move_left(),
-            self.move_right()]
 
         # Compose self.children of all non-None children states
-        self.children = [state for state in children if state is not None]
+        self.children = self.successors()
         return self.children
-    
+
 def calculate_total_cost(state):
     """calculate the total estimated cost of a state"""
 
+    return calculate_heuristic(state.config, state.n) + state.cost
+
+def calculate_heuristic(config, n):
+    """calculate the sum of manhattan distances of all tiles from scratch"""
+
     sum = 0
-    for i in range(0, len(state.config)):
-        if state.config[i]!=0:
-            sum += calculate_manhattan_dist(i,state.config[i],state.n)
-    return sum + state.cost
+    for i in range(0, len(config)):
+        if config[i]!=0:
+            sum += calculate_manhattan_dist(i,config[i],n)
+    return sum
 
 def calculate_manhattan_dist(idx, value, n):
     """calculate the manhattan distance of a tile"""
 
     row,col = idx//n, idx%n
-    correct_row, correct_col = value//n, value%n 
-    return abs(row-correct_row)+abs(col-correct_col)
\ No newline at end of file
+    correct_row, correct_col = value//n, value%n
+    return abs(row-correct_row)+abs(col-correct_col)
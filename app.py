@@ -5,6 +5,43 @@ from PIL import Image, ImageTk
 import random
 from tkinter import filedialog
 import os 
+import threading
+
+import instances
+import puzzle
+import ranking
+import solution_cache
+from PuzzleState import PuzzleState
+
+#milliseconds between two progress updates, and between two moves of a solution
+POLL_INTERVAL = 100
+ANIMATION_INTERVAL = 250
+
+#longer solutions are played faster to last at most ANIMATION_SECONDS, and beyond
+#MAX_ANIMATED_MOVES they are applied at once
+ANIMATION_SECONDS = 30
+MAX_ANIMATED_MOVES = 2000
+
+#seconds the ARA* button searches before playing its best solution
+AI_DEADLINE = 5
+
+#frames of a sliding tile and milliseconds between them
+SLIDE_FRAMES = 6
+SLIDE_INTERVAL = 15
+
+#optimal solution lengths of a shuffled board per difficulty and grid size, None for any solvable board
+DIFFICULTIES = {
+    'Random' : None,
+    'Easy'   : {2 : (1, 3), 3 : (6, 12), 4 : (8, 14), 5 : (8, 14)},
+    'Medium' : {2 : (4, 6), 3 : (16, 22), 4 : (18, 24), 5 : (18, 24)},
+}
+
+#path -> (modification time, opened image), (path, modification time, grid) -> tile images
+_images = {}
+_tile_images = {}
+
+#optimal solutions of the AI buttons, a board asked for again (or its transpose) is answered at once
+_solutions = solution_cache.SolutionCache()
 
 
 class Tiles():
@@ -15,6 +52,7 @@ class Tiles():
         self.grid = grid
         self.gap = None
         self.moves = 0
+        self.misplaced = 0
 
     '''
     Adds a Tile object to a list of Tiles
@@ -40,43 +78,47 @@ class Tiles():
     Changes the position of the gap and the position of the tile moved
     '''
     def slide_gap(self,tile):
-        try:
-            pos = self.gap.pos
-            self.tiles_dict[pos] = tile
-            self.tiles_dict[tile.pos] = self.gap
-            self.gap.pos = tile.pos 
-            tile.pos = pos
-            self.moves+=1
-        except:
-            pass
+        # only the two tiles swapped can change the number of misplaced tiles
+        self.misplaced -= (not tile.is_correct_pos()) + (not self.gap.is_correct_pos())
+        pos = self.gap.pos
+        self.tiles_dict[pos] = tile
+        self.tiles_dict[tile.pos] = self.gap
+        self.gap.pos = tile.pos 
+        tile.pos = pos
+        self.moves+=1
+        self.misplaced += (not tile.is_correct_pos()) + (not self.gap.is_correct_pos())
     
     '''
-    Slides gap based on key input
+    Slides gap based on key input, only the tile moved is drawn again
     '''
-    def slide(self,key):
+    def slide(self,key,animate=False):
         up,down,right,left = self.get_tiles_around_gap()
-        if key == 'Up':
-            self.slide_gap(up)
-        elif key == 'Down': 
-            self.slide_gap(down)
-        elif key == 'Right':
-            self.slide_gap(right)
-        elif key == 'Left':
-            self.slide_gap(left)
-        self.show()
+        tile = {'Up':up, 'Down':down, 'Right':right, 'Left':left}.get(key)
+        if tile is not None:
+            self.slide_gap(tile)
+            tile.show(animate)
 
 
     '''
-    Shuffles the list of tiles
+    Shuffles the tiles into a solvable layout, one whose optimal solution
+    length lies in band if it is given
     '''
-    def shuffle(self):
-        random.shuffle(self.tiles)
+    def shuffle(self, band=None):
+        if band is None:
+            config = instances.random_board(self.grid)
+        else:
+            config = instances.generate(self.grid, band=band, rng=random)
+        # inverse of config(): cell last-index of the layout holds the tile whose home is last-tile
+        last = self.grid*self.grid - 1
+        homes = {tile.curpos[0]*self.grid + tile.curpos[1] : tile for tile in self.tiles}
+        self.tiles = [homes[last - config[last - cell]] for cell in range(last + 1)]
         i = 0
         for row in range(self.grid):
             for col in range(self.grid):
                 self.tiles[i].pos = (row,col)
                 self.tiles_dict[(row,col)] = self.tiles[i]
                 i+=1
+        self.misplaced = sum(not tile.is_correct_pos() for tile in self.tiles)
     
     '''
     Shows the tiles
@@ -89,84 +131,175 @@ class Tiles():
     def set_gap(self, index):
         self.gap = self.tiles[index]
 
+    '''
+    Returns the layout as a board for puzzle.py. The board is turned by
+    180 degrees, so the home of the gap (the last cell) becomes the home
+    of the blank (index 0) and every tile keeps its neighbours
+    '''
+    def config(self):
+        last = self.grid*self.grid - 1
+        config = [0]*(last + 1)
+        for tile in self.tiles:
+            cell = tile.pos[0]*self.grid + tile.pos[1]
+            home = tile.curpos[0]*self.grid + tile.curpos[1]
+            config[last - cell] = last - home
+        return config
+
     '''
     Check if tile is placed correctly
     '''       
     def is_correct(self):
-        for tile in self.tiles:
-            if not tile.is_correct_pos():
-                return False
-        return True 
+        return self.misplaced == 0
 
-class Tile(Label):
-    def __init__(self,parent, image, pos):
-        Label.__init__(self,parent,image=image)
+class Tile():
+    def __init__(self,canvas, image, pos, size):
+        self.canvas = canvas
         self.image = image
+        self.size = size
         self.pos = pos[0], pos[1]
         self.curpos = pos[0], pos[1]
-    
-    def show(self):
-        self.grid(row=self.pos[0], column=self.pos[1])
+        self.item = None
+        self.animation = None
+
+    '''
+    Draws the tile at its position, sliding there from where it was drawn if animate
+    '''
+    def show(self,animate=False):
+        x, y = self.pos[1]*self.size, self.pos[0]*self.size
+        if self.item is None:
+            self.item = self.canvas.create_image(x, y, image=self.image, anchor=NW)
+            return
+        if self.animation is not None:
+            self.canvas.after_cancel(self.animation)
+            self.animation = None
+        if not animate:
+            self.canvas.coords(self.item, x, y)
+            return
+
+        x0, y0 = self.canvas.coords(self.item)
+        def step(frame):
+            self.canvas.coords(self.item, x0 + (x - x0)*frame/SLIDE_FRAMES, y0 + (y - y0)*frame/SLIDE_FRAMES)
+            self.animation = self.canvas.after(SLIDE_INTERVAL, step, frame + 1) if frame < SLIDE_FRAMES else None
+        step(1)
 
     '''
     Check if a tile is at the correct positon
     '''
     def is_correct_pos(self):
-        if self.pos == self.curpos:
-            print(str(self.pos)+"correct")
-            print(self.curpos)
         return self.pos == self.curpos
 
 class Board(Frame):
     MAX_BOARD_SIZE = 2000
-    def __init__(self,parent,image,grid,win):
+    def __init__(self,parent,image,grid,win,animate=True,band=None):
         Frame.__init__(self,parent)
  
         self.parent = parent 
+        self.path = image
         self.image = self.open_image(image)
         self.grid = grid 
         self.win = win
-        self.tileSize = self.image.size[0]/self.grid
+        self.animate_moves = animate
+        self.tileSize = self.image.size[0]//self.grid
+        self.canvas = Canvas(self, width=self.tileSize*self.grid, height=self.tileSize*self.grid, highlightthickness=0)
+        self.canvas.pack()
         self.tiles = self.create_tiles()
-        self.tiles.shuffle()
+        self.tiles.shuffle(band)
         self.tiles.show()
         self.bind_keys()
 
+    '''
+    Opens the image, cached until the file changes
+    '''
     def open_image(self,image):
+        mtime = os.path.getmtime(image)
+        if image in _images and _images[image][0] == mtime:
+            return _images[image][1]
+
         im = Image.open(image)
 
         #if image is larger than maximum board size crop it
         if min(im.size) > self.MAX_BOARD_SIZE:
-            im = im.resize((self.MAX_BOARD_SIZE,self.MAX_BOARD_SIZE),Image.ANTIALIAS)
+            im = im.resize((self.MAX_BOARD_SIZE,self.MAX_BOARD_SIZE),Image.LANCZOS)
         
         # if image not square crop it
         if im.size[0] !=  im.size[1]:
             im= im.crop((0,0,im.size[0],im.size[0]))
+        _images[image] = (mtime, im)
         return im
     def bind_keys(self):
         self.bind_all('<Key-Up>',self.slide)
         self.bind_all('<Key-Down>',self.slide)
         self.bind_all('<Key-Right>',self.slide)
         self.bind_all('<Key-Left>',self.slide)
+
+    def unbind_keys(self):
+        for key in ('<Key-Up>','<Key-Down>','<Key-Right>','<Key-Left>'):
+            self.unbind_all(key)
+
+    '''
+    Plays a puzzle.py solution of the board, one move every ANIMATION_INTERVAL
+    or faster for long solutions. The keys are disabled meanwhile
+    '''
+    def animate(self, path, done=None):
+        self.unbind_keys()
+        # the board of puzzle.py is turned by 180 degrees, see Tiles.config
+        keys = [PuzzleState.inverse_action[action] for action in path]
+
+        def finish():
+            self.bind_keys()
+            if done is not None:
+                done()
+
+        if len(keys) > MAX_ANIMATED_MOVES:
+            for key in keys:
+                self.tiles.slide(key)
+            finish()
+            return
+        interval = min(ANIMATION_INTERVAL, ANIMATION_SECONDS*1000//max(len(keys), 1))
+        # tiles only glide when there is time for it before the next move
+        glide = interval >= SLIDE_FRAMES*SLIDE_INTERVAL
+
+        def step(i):
+            if not self.winfo_exists():
+                return
+            if i == len(keys):
+                finish()
+                return
+            self.tiles.slide(keys[i], glide)
+            self.after(interval, step, i + 1)
+        step(0)
     
     def slide(self,event):
-        self.tiles.slide(event.keysym)
+        self.tiles.slide(event.keysym, self.animate_moves)
         if self.tiles.is_correct():
             pass
             #self.win(self.tiles.moves)
     
 
     
+    '''
+    Returns the image of every tile in row order, sliced once per image and grid size
+    '''
+    def tile_images(self):
+        key = (self.path, os.path.getmtime(self.path), self.grid)
+        if key not in _tile_images:
+            images = []
+            for row in range(self.grid):
+                for col in range(self.grid):
+                    x0 = col*self.tileSize 
+                    y0 = row*self.tileSize 
+                    x1 = x0 + self.tileSize 
+                    y1 = y0 + self.tileSize
+                    images.append(ImageTk.PhotoImage(self.image.crop((x0,y0,x1,y1))))
+            _tile_images[key] = images
+        return _tile_images[key]
+
     def create_tiles(self):
         tiles = Tiles(self.grid)
+        images = self.tile_images()
         for row in range(self.grid):
             for col in range(self.grid):
-                x0 = row*self.tileSize 
-                y0 = col*self.tileSize 
-                x1 = x0 + self.tileSize 
-                y1 = y0 + self.tileSize
-                tileImage = ImageTk.PhotoImage(self.image.crop((x0,y0,x1,y1)))
-                tile = Tile(self,tileImage,(row,col))
+                tile = Tile(self.canvas,images[row*self.grid + col],(row,col),self.tileSize)
                 tiles.add(tile)
         tiles.set_gap(-1)
         return tiles
@@ -174,14 +307,57 @@ class Board(Frame):
 
 
 
+class Solver():
+    '''
+    Runs puzzle.solve in a background thread, so the Tk mainloop keeps
+    running. The GUI polls progress() and done() with after()
+    '''
+    def __init__(self, config, algorithm, max_seconds=None):
+        self.search = puzzle.Search(max_seconds=max_seconds)
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(config, algorithm))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, config, algorithm):
+        try:
+            self.result = puzzle.solve(config, algorithm, search=self.search, cache=_solutions)
+        except Exception as e:
+            self.error = e
+
+    def progress(self):
+        return self.search.progress()
+
+    def cancel(self):
+        self.search.cancel()
+
+    def done(self):
+        return not self.thread.is_alive()
+
 class Main():
     def __init__(self,parent):
         self.parent = parent 
         self.image = StringVar()
         self.winText = StringVar()
         self.grid = IntVar()
+        self.difficulty = StringVar()
+        #buttons disabled while an AI solution is searched or played
+        self.controls = []
         self.create_main_frame()
 
+    '''
+    Packs a button that is disabled while an AI solution is searched or played
+    '''
+    def control(self, frame, text, command):
+        button = Button(frame, text=text, command=command)
+        button.pack(padx=10,pady=10)
+        self.controls.append(button)
+
+    def set_busy(self, busy):
+        for button in self.controls:
+            button.state(['disabled' if busy else '!disabled'])
+
     def create_main_frame(self):
         #create main frame and labels and buttons
         self.mainFrame  = Frame(self.parent,background='Rosy Brown1')
@@ -190,11 +366,14 @@ class Main():
         Entry(frame,textvariable=self.image, width=50).grid(row=1, column=1, padx=10, pady=10, sticky=W)
         Button(frame, text='Choose Image', command=self.browse).grid(row=0,column=2,pady=10,padx=10)
         OptionMenu(frame,self.grid,*[2,3,4,5]).grid(row=1,column=1,padx=10,pady=10,sticky=W)
+        OptionMenu(frame,self.difficulty,'Random',*DIFFICULTIES).grid(row=1,column=2,padx=10,pady=10,sticky=W)
         frame.pack()
-        Button(self.mainFrame,text='Let\'s Play!',  command=self.start).pack(padx=10,pady=10)
-        Button(self.mainFrame, text='Get AI Solution A*', command=self.play_ai_ast).pack(padx=10,pady=10)
-        Button(self.mainFrame, text='Get AI Solution BFS', command=self.play_ai_bfs).pack(padx=10,pady=10)
-        Button(self.mainFrame, text='Get AI Solution DFS', command=self.play_ai_dfs).pack(padx=10,pady=10)
+        self.control(self.mainFrame, 'Let\'s Play!', self.start)
+        self.control(self.mainFrame, 'Get AI Solution A*', self.play_ai_ast)
+        self.control(self.mainFrame, 'Get AI Solution ARA*', self.play_ai_ara)
+        self.control(self.mainFrame, 'Get AI Solution Row by Row', self.play_ai_macro)
+        self.control(self.mainFrame, 'Get AI Solution BFS', self.play_ai_bfs)
+        self.control(self.mainFrame, 'Get AI Solution DFS', self.play_ai_dfs)
         self.mainFrame.pack()
 
         #create board frame after the game has started
@@ -203,16 +382,22 @@ class Main():
         #create win frame
         self.winFrame = Frame(self.parent, background='Rosy Brown1')
         Label(self.winFrame, textvariable=self.winText, font=("Courier", 40, "bold"), fg='Pale Violet Red3',background='Rosy Brown2').pack(padx=10,pady=10)
-        Button(self.winFrame,text='Play Again', command=self.play_again).pack(padx=10,pady=10)
-        Button(self.winFrame, text='Get AI Solution A*', command=self.play_ai_ast).pack(padx=10,pady=10)
-        Button(self.winFrame, text='Get AI Solution BFS', command=self.play_ai_bfs).pack(padx=10,pady=10)
-        Button(self.winFrame, text='Get AI Solution DFS', command=self.play_ai_dfs).pack(padx=10,pady=10)
+        self.control(self.winFrame, 'Play Again', self.play_again)
+        self.control(self.winFrame, 'Get AI Solution A*', self.play_ai_ast)
+        self.control(self.winFrame, 'Get AI Solution ARA*', self.play_ai_ara)
+        self.control(self.winFrame, 'Get AI Solution Row by Row', self.play_ai_macro)
+        self.control(self.winFrame, 'Get AI Solution BFS', self.play_ai_bfs)
+        self.control(self.winFrame, 'Get AI Solution DFS', self.play_ai_dfs)
 
     def start(self):
         image = self.image.get()
         grid = self.grid.get()
         if os.path.exists(image):
-            self.board = Board(self.parent,image,grid,self.win)
+            if isinstance(self.board, Board):
+                self.board.unbind_keys()
+            self.board.destroy()
+            bands = DIFFICULTIES[self.difficulty.get()]
+            self.board = Board(self.parent,image,grid,self.win,band=bands[grid] if bands else None)
             self.mainFrame.pack_forget()
             self.board.pack()
 
@@ -229,28 +414,83 @@ class Main():
         self.mainFrame.pack()
 
     def play_ai_ast(self):
-        game = str([1,3,5,0,4,2,6,7,8]).replace('[','').replace(']','')
-        os.system('python puzzle.py ast 1,3,5,0,4,2,6,7,8')
-        f = open('output.txt','r')
-        newWindow = Toplevel(self.mainFrame)
-        Label(newWindow,text='A* solution for N-Puzzle Game', font=("Courier", 20, "bold"), fg='Pale Violet Red3').pack(padx=10, pady=10)
-        Label(newWindow,text=f.read(), font=("Courier", 10), fg='Pale Violet Red3').pack(padx=10, pady=10)
+        self.play_ai('ast', 'A*')
+
+    def play_ai_ara(self):
+        self.play_ai('ara', 'ARA*', AI_DEADLINE)
+
+    def play_ai_macro(self):
+        self.play_ai('macro', 'Row by row')
 
     def play_ai_bfs(self):
-        game = str([1,3,5,0,4,2,6,7,8]).replace('[','').replace(']','')
-        os.system('python puzzle.py bfs 1,3,5,0,4,2,6,7,8')
-        f = open('output.txt','r')
-        newWindow = Toplevel(self.mainFrame)
-        Label(newWindow,text='BFS solution for N-Puzzle Game', font=("Courier", 20, "bold"), fg='Pale Violet Red3').pack(padx=10, pady=10)
-        Label(newWindow,text=f.read(), font=("Courier", 10), fg='Pale Violet Red3').pack(padx=10, pady=10)
+        self.play_ai('bfs', 'BFS')
 
     def play_ai_dfs(self):
-        game = str([1,3,5,0,4,2,6,7,8]).replace('[','').replace(']','')
-        os.system('python puzzle.py dfs 1,3,5,0,4,2,6,7,8')
-        f = open('output.txt','r')
-        newWindow = Toplevel(self.mainFrame)
-        Label(newWindow,text='DFS solution for N-Puzzle Game', font=("Courier", 20, "bold"), fg='Pale Violet Red3').pack(padx=10, pady=10)
-        Label(newWindow,text=f.read(), font=("Courier", 10), fg='Pale Violet Red3').pack(padx=10, pady=10)
+        self.play_ai('dfs', 'DFS')
+
+    '''
+    Solves the board being played in the background, showing the progress
+    in a new window, then plays the solution on the board. The keys and
+    the buttons starting a game or a solution are disabled until it is
+    played or given up
+    '''
+    def play_ai(self, algorithm, name, max_seconds=None):
+        newWindow = Toplevel(self.parent)
+        Label(newWindow,text=name+' solution for N-Puzzle Game', font=("Courier", 20, "bold"), fg='Pale Violet Red3').pack(padx=10, pady=10)
+        status = StringVar()
+        Label(newWindow,textvariable=status, font=("Courier", 10), fg='Pale Violet Red3').pack(padx=10, pady=10)
+
+        if not isinstance(self.board, Board):
+            status.set('Start a game first!')
+            return
+        config = self.board.tiles.config()
+        if not ranking.is_reachable(config, self.board.grid):
+            status.set('This board can not be solved!')
+            return
+
+        board = self.board
+        board.unbind_keys()
+        self.set_busy(True)
+        solver = Solver(config, algorithm, max_seconds)
+        cancel = Button(newWindow, text='Cancel', command=solver.cancel)
+        cancel.pack(padx=10, pady=10)
+
+        def finish():
+            if board is self.board and board.winfo_exists():
+                board.bind_keys()
+            self.set_busy(False)
+
+        def poll():
+            if not newWindow.winfo_exists():
+                solver.cancel()
+                finish()
+                return
+            if not solver.done():
+                expanded, frontier, elapsed = solver.progress()
+                status.set('nodes expanded: {}\nfrontier size: {}\nelapsed: {:.1f} s'.format(
+                    expanded, frontier if frontier is not None else '-', elapsed))
+                newWindow.after(POLL_INTERVAL, poll)
+                return
+
+            cancel.pack_forget()
+            result = solver.result
+            if solver.error is not None:
+                status.set('Error: ' + ' '.join(map(str, solver.error.args)))
+                finish()
+            elif result.status != 'solved':
+                status.set('No solution found ({})'.format(result.status))
+                finish()
+            elif board is not self.board or not board.winfo_exists():
+                status.set('The game changed, the solution is not played')
+                finish()
+            else:
+                text = 'cost_of_path: {}\nnodes_expanded: {}\nrunning_time: {:.3f} s'.format(
+                    result.cost_of_path, result.nodes_expanded, result.running_time)
+                if 'suboptimality' in result.extra:
+                    text += '\nat most {:.2f} times the optimal cost'.format(result.extra['suboptimality'])
+                status.set(text)
+                board.animate(result.path_to_goal, done=finish)
+        poll()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,102 @@
+"""
+Array-backed store of a search tree.
+
+Node i of the tree lives at index i of parallel typed arrays: its packed
+board, the index of its parent, its cost g, the code of the move that
+created it and the index of its blank. That costs about 18 bytes per node
+for boards up to 4x4, against a PuzzleState object with its own integer,
+tuple and list for every node. Paths are rebuilt by walking parent
+indices, and the tree is freed in one go with the arena.
+"""
+from array import array
+
+from PuzzleState import PuzzleState, tile_bits, neighbour_table
+
+#move code -> action, codes are PuzzleState.heap_order
+ACTIONS = {code : action for action, code in PuzzleState.heap_order.items()}
+
+NO_PARENT = -1
+
+_moves = {}
+
+def blank_moves(n):
+    """
+    neighbour_table with move codes instead of action names.
+    :return List, entry [blank] lists (target index, move code) in the order UDLR
+    """
+    try:
+        return _moves[n]
+    except KeyError:
+        pass
+    _moves[n] = [tuple((target, PuzzleState.heap_order[action]) for target, action in moves)
+                 for moves in neighbour_table(n)]
+    return _moves[n]
+
+
+class NodeArena(object):
+    """
+        Append only search tree of n*n boards. Nodes are referred to by
+        their index, in the order they were added.
+    """
+    def __init__(self, n):
+        """
+        :param n->int : Size of the board
+        """
+        self.n = n
+        # boards wider than 64 bits do not fit a typed array
+        self.boards  = array('Q') if n*n*tile_bits(n) <= 64 else []
+        self.parents = array('i')
+        self.costs   = array('I')
+        self.moves   = array('b')
+        self.blanks  = array('B')
+
+    def add(self, board, blank, parent=NO_PARENT, move=PuzzleState.heap_order['Initial']):
+        """
+        Appends a node.
+        :param board->int : packed board
+        :param blank->int : index of the empty block
+        :param parent->int : index of the parent node, NO_PARENT for the root
+        :param move->int : code of the move from the parent, see ACTIONS
+        :return index of the new node
+        """
+        self.boards.append(board)
+        self.parents.append(parent)
+        self.costs.append(self.costs[parent] + 1 if parent != NO_PARENT else 0)
+        self.moves.append(move)
+        self.blanks.append(blank)
+        return len(self.parents) - 1
+
+    def children(self, index):
+        """
+        Boards reachable with one move from node index, without adding them.
+        :return List of (board, blank, move code)
+        """
+        w = tile_bits(self.n)
+        mask = (1 << w) - 1
+        board = self.boards[index]
+        blank = self.blanks[index]
+        children = []
+        for target, move in blank_moves(self.n)[blank]:
+            tile = (board >> (target*w)) & mask
+            children.append((board - (tile << (target*w)) + (tile << (blank*w)), target, move))
+        return children
+
+    def path(self, index):
+        """actions leading from the root to node index"""
+        path = []
+        while self.parents[index] != NO_PARENT:
+            path.append(ACTIONS[self.moves[index]])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    def nbytes(self):
+        """memory held by the arrays"""
+        total = 0
+        for values in (self.boards, self.parents, self.costs, self.moves, self.blanks):
+            if isinstance(values, array):
+                total += values.itemsize*len(values)
+        return total
+
+    def __len__(self):
+        return len(self.parents)
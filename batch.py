@@ -0,0 +1,227 @@
+"""
+Solves many boards in parallel over a process pool.
+
+Boards are read one per line from a file or stdin, either comma separated
+(1,3,5,0,4,2,6,7,8) or as JSON objects with a "board" field. One JSON line
+is written per board with the fields of puzzle.SolveResult plus "board",
+"algorithm" and "status" (solved, unsolvable, budget_exceeded or error).
+A line that is not a board gets an error record holding the raw "line":
+
+    python puzzle.py batch boards.txt --algorithm ast --output results.jsonl
+    cat boards.txt | python puzzle.py batch - --unordered --time-budget 5
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import puzzle
+import heuristics
+
+#per worker process, set by init_worker
+_options = None
+_heuristics = {}
+
+def parse_board(line):
+    """board of a comma separated or JSON line, raises ValueError if it is not one"""
+    try:
+        if line.startswith("{"):
+            board = json.loads(line)["board"]
+            if not isinstance(board, list):
+                board = board.split(",")
+        else:
+            board = line.split(",")
+        return list(map(int, board))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError("no board field : %s" % e)
+
+def read_boards(lines):
+    """
+    Yields (line, board, error) for every line, skipping blank lines and # comments.
+    board is None and error tells why when the line can not be read.
+    :param lines : iterable of strings
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            yield line, parse_board(line), None
+        except ValueError as e:
+            yield line, None, str(e)
+
+def board_key(board):
+    return ",".join(map(str, board))
+
+def completed_boards(path):
+    """
+    Boards already present in an earlier output file, used to resume. Input
+    lines that could not be read are recorded by their text, which never
+    reads as a board key.
+    """
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                done.add(board_key(record["board"]) if "board" in record else record["line"])
+            except (ValueError, KeyError, TypeError):
+                # a line cut short by an interrupted run, solve that board again
+                continue
+    return done
+
+def init_worker(options):
+    """runs once in every worker process"""
+    global _options
+    _options = options
+
+def solve_board(task):
+    """
+    Solves one board inside a worker process.
+    :param task->tuple : (index, board)
+    :return dict of the result fields
+    """
+    index, board = task
+    result = {"index" : index, "board" : board, "algorithm" : _options["algorithm"]}
+    try:
+        # heuristics are built once per board size and reused by the worker
+        n = int(math.sqrt(len(board)))
+        if n not in _heuristics:
+            _heuristics[n] = heuristics.get_heuristic(_options["heuristic"], n, **_options["heuristic_options"])
+
+        solved = puzzle.solve(board, _options["algorithm"], _heuristics[n],
+                              _options["node_budget"], _options["time_budget"])
+        result["status"] = solved.status
+        if solved.reason is not None:
+            result["reason"] = solved.reason
+        result.update(solved.fields())
+    except Exception as e:
+        result["status"] = "error"
+        result["reason"] = " ".join(map(str, e.args))
+    return result
+
+def run_batch(lines, out, algorithm="ast", workers=None, ordered=True, skip=(),
+              node_budget=None, time_budget=None, heuristic="manhattan", heuristic_options=None):
+    """
+    Streams results of lines to out. At most a few boards per worker are in
+    flight at any time, so neither the input nor the results are held in memory.
+
+    :param lines : iterable of board lines
+    :param out : writable text file, receives one JSON line per board
+    :param algorithm->string : key of puzzle.search_modes
+    :param workers->int : number of processes, defaults to the number of cores
+    :param ordered->bool : write results in input order instead of as they finish
+    :param skip->set : board keys and unreadable lines to leave out, see completed_boards
+    :param node_budget->int : maximum nodes expanded per board
+    :param time_budget->float : maximum seconds per board
+    :return dict counting the results by status, and the boards left out under 'skipped'
+    """
+    if algorithm not in puzzle.search_modes:
+        raise Exception("Unknown algorithm, choose from %s : " % ", ".join(sorted(puzzle.search_modes)), algorithm)
+
+    workers = workers or os.cpu_count() or 1
+    window  = workers*4
+    options = {
+        "algorithm"         : algorithm,
+        "node_budget"       : node_budget,
+        "time_budget"       : time_budget,
+        "heuristic"         : heuristic,
+        "heuristic_options" : heuristic_options or {},
+    }
+
+    counts  = {"skipped" : 0}
+    pending = set()
+    #finished results waiting for an earlier board when ordered
+    ready   = {}
+    next_index = [0]
+
+    def emit(result):
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+        del result["index"]
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    def collect(results):
+        for result in results:
+            if not ordered:
+                emit(result)
+                continue
+            ready[result["index"]] = result
+        while next_index[0] in ready:
+            emit(ready.pop(next_index[0]))
+            next_index[0] += 1
+
+    def tasks():
+        index = 0
+        for line, board, error in read_boards(lines):
+            if (board_key(board) if board is not None else line) in skip:
+                counts["skipped"] += 1
+                continue
+            yield index, line, board, error
+            index += 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(options,)) as pool:
+        for index, line, board, error in tasks():
+            if board is None:
+                #a line that is not a board is reported without stopping the batch
+                collect([{"index" : index, "line" : line, "algorithm" : algorithm, "status" : "error", "reason" : error}])
+                continue
+            while len(pending) + len(ready) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(future.result() for future in done)
+            pending.add(pool.submit(solve_board, (index, board)))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(future.result() for future in done)
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="puzzle.py batch", description="Solve a stream of boards in parallel")
+    parser.add_argument("input", help="file with one board per line, - for stdin")
+    parser.add_argument("--algorithm", default="ast", help=", ".join(sorted(puzzle.search_modes)))
+    parser.add_argument("--output", help="JSON lines file, stdout if omitted")
+    parser.add_argument("--workers", type=int, help="worker processes, defaults to the number of cores")
+    parser.add_argument("--time-budget", type=float, help="seconds allowed per board")
+    parser.add_argument("--node-budget", type=int, help="nodes expanded allowed per board")
+    parser.add_argument("--unordered", action="store_true", help="write results as soon as they finish")
+    parser.add_argument("--resume", action="store_true", help="skip boards already in the output file and append")
+    parser.add_argument("--heuristic", default="manhattan")
+    parser.add_argument("--pdb-dir", default=heuristics.pattern_db.DEFAULT_DIRECTORY)
+    parser.add_argument("--partition")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+
+    skip = completed_boards(args.output) if args.resume else set()
+    heuristic_options = {"directory" : args.pdb_dir}
+    if args.partition:
+        heuristic_options["partition"] = heuristics.pattern_db.parse_partition(args.partition)
+
+    lines = sys.stdin if args.input == "-" else open(args.input)
+    out   = open(args.output, "a" if args.resume else "w") if args.output else sys.stdout
+    if args.resume and out.tell() > 0:
+        # start on a fresh line after a run that was cut off mid-write
+        with open(args.output, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read() != b"\n":
+                out.write("\n")
+    try:
+        counts = run_batch(lines, out, args.algorithm.lower(), args.workers, not args.unordered, skip,
+                           args.node_budget, args.time_budget, args.heuristic, heuristic_options)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+
+    skipped = counts.pop("skipped")
+    summary = ", ".join("%d %s" % (count, status) for status, count in sorted(counts.items()))
+    print("Batch completed: %s%s" % (summary or "no boards", ", %d already done" % skipped if skipped else ""), file=sys.stderr)
@@ -0,0 +1,420 @@
+"""
+Reproducible benchmarks of the search modes.
+
+Every engine runs over fixed instance sets drawn from a seed:
+
+  - 8-puzzle : boards of every band of optimal depths 0-3, 4-7, ... 28-31,
+  - 4x4      : 15-puzzle boards of optimal depth 20 to 30,
+  - korf100  : the 100 15-puzzle instances of Korf (1985), from korf100.txt
+               or another file given with --korf. Korf's numbering (blank 0
+               in the top left corner of the goal) is the one of this repo.
+
+The search modes use the manhattan distance on the 8-puzzle and 4x4 sets
+and the pattern database on Korf's instances, which the manhattan distance
+does not get through in reasonable time; build it first with
+'python pattern_db.py build --size 4'. --heuristic sets one for every set,
+korf100 refuses one without pdb.
+
+Each board is solved in a fresh process, so the peak memory is that of
+the board alone, and the wall time, nodes expanded, nodes per second, peak
+RSS and solution length are written to a JSON file. Engines only run on the
+sets they can finish, e.g. bfs and dfs on the 8-puzzle only, unless
+--all-pairs is given. compare flags what got worse against a saved
+baseline by more than a threshold:
+
+    python benchmark.py run --engines bfs,dfs,ast --output baseline.json
+    python benchmark.py run --engines ast,ida --sets 4x4,korf100
+    python benchmark.py compare baseline.json current.json --threshold 0.1
+
+successors measures the nodes generated per second by a random walk with
+PuzzleState.successors(), against a copy of the original list based
+move methods:
+
+    python benchmark.py successors --size 4 --seconds 2
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import queue
+import random
+import platform
+import argparse
+import subprocess
+
+import hda
+import heuristics
+import instances
+import puzzle
+import telemetry
+from PuzzleState import PuzzleState
+
+SETS = ["8-puzzle", "4x4", "korf100"]
+
+#Korf's instances shipped with the repo
+KORF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "korf100.txt")
+
+#heuristic of each set unless one is given
+SET_HEURISTICS = {"8-puzzle" : "manhattan", "4x4" : "manhattan", "korf100" : "pdb"}
+
+#optimal depths of the 8-puzzle boards, by band
+EIGHT_PUZZLE_BANDS = [(low, low + 3) for low in range(0, 32, 4)]
+
+#optimal depths of the seeded 4x4 boards
+FIFTEEN_PUZZLE_BAND = (20, 30)
+
+#engines that do not get through a 4x4 board, and those that get through Korf's instances
+SMALL_ONLY   = {"bfs", "vbfs", "ebfs", "dfs", "table"}
+KORF_ENGINES = {"ida", "hda", "ara", "macro"}
+
+#seconds per engine and set below which differences in time are noise
+MIN_SECONDS = 0.05
+
+def handles(engine, name):
+    """True when engine is expected to finish the boards of instance set name"""
+    if name == "korf100":
+        return engine in KORF_ENGINES
+    if name == "4x4":
+        return engine not in SMALL_ONLY
+    return True
+
+def read_korf(path):
+    """
+    Boards of a file of Korf's instances. A line holds the 16 cells, optionally
+    preceded by the instance number and followed by the optimal solution length.
+    """
+    boards = []
+    with open(path) as f:
+        for line in f:
+            values = line.replace(",", " ").split()
+            if not values or values[0].startswith("#"):
+                continue
+            values = list(map(int, values))
+            if len(values) not in (16, 17, 18):
+                raise Exception("Not a 15-puzzle board : ", line.strip())
+            values = values[:16] if len(values) == 16 else values[1:17]
+            if sorted(values) != list(range(16)):
+                raise Exception("Not a 15-puzzle board : ", line.strip())
+            boards.append(values)
+    return boards
+
+def instance_set(name, seed, per_band=2, count=10, korf=KORF_FILE):
+    """
+    Boards of an instance set, the same for the same seed.
+    :param per_band->int : 8-puzzle boards per band of depths
+    :param count->int : number of 4x4 boards
+    :param korf->string : file of Korf's instances
+    """
+    rng = random.Random(seed)
+    if name == "8-puzzle":
+        return [instances.generate(3, band=band, rng=rng) for band in EIGHT_PUZZLE_BANDS for _ in range(per_band)]
+    if name == "4x4":
+        return [instances.generate(4, band=FIFTEEN_PUZZLE_BAND, rng=rng) for _ in range(count)]
+    if name == "korf100":
+        if not os.path.exists(korf):
+            raise Exception("File of Korf's instances not found : ", korf)
+        return read_korf(korf)
+    raise Exception("Unknown instance set, choose from %s : " % ", ".join(SETS), name)
+
+def measure(task):
+    """
+    Solves one board in this process.
+    :param task->dict : engine, board, heuristic, node_budget, time_budget, repeat
+    :return dict of the measures
+    """
+    best = None
+    for _ in range(task["repeat"]):
+        start_time = time.time()
+        result = puzzle.solve(task["board"], task["engine"], task["heuristic"], task["node_budget"], task["time_budget"])
+        seconds = time.time() - start_time
+        if best is None or seconds < best[0]:
+            best = (seconds, result)
+    seconds, result = best
+    return {
+        "status"           : result.status,
+        "seconds"          : seconds,
+        "nodes_expanded"   : result.nodes_expanded,
+        "nodes_per_second" : result.nodes_expanded/seconds if seconds > 0 else 0.0,
+        "peak_rss_kb"      : telemetry.peak_rss(),
+        "cost"             : result.cost_of_path,
+    }
+
+def measure_child(task, results):
+    try:
+        results.put(measure(task))
+    except Exception as e:
+        results.put({"status" : "error", "reason" : " ".join(map(str, e.args))})
+
+def measure_isolated(task):
+    """measure() in a forked process, whose peak RSS starts from the size it was forked at"""
+    ctx = hda.context()
+    results = ctx.Queue()
+    process = ctx.Process(target=measure_child, args=(task, results))
+    process.start()
+    while True:
+        try:
+            measures = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                measures = {"status" : "error", "reason" : "process died with exit code %s" % process.exitcode}
+                break
+    process.join()
+    return measures
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def set_heuristic(name, heuristic=None):
+    """
+    Heuristic spec of an instance set, SET_HEURISTICS unless heuristic is given.
+    Raises for Korf's instances without the pattern database, which would not finish.
+    """
+    spec = heuristic or SET_HEURISTICS[name]
+    if name == "korf100" and "pdb" not in spec.lower():
+        raise Exception("Korf's instances need the pattern database heuristic, e.g. pdb or max(pdb,...) : ", spec)
+    return spec
+
+def run(engines, sets, seed=1, per_band=2, count=10, korf=KORF_FILE, heuristic=None, node_budget=None,
+        time_budget=None, repeat=1, isolated=True, all_pairs=False, out=sys.stderr):
+    """
+    Runs every engine over every instance set it handles.
+    :param heuristic : spec used on every set, None for SET_HEURISTICS
+    :return dict with the settings under 'meta' and one entry per board under 'results'
+    """
+    for engine in engines:
+        if engine not in puzzle.search_modes:
+            raise Exception("Unknown algorithm, choose from %s : " % ", ".join(sorted(puzzle.search_modes)), engine)
+    #checked before anything runs when an engine uses the heuristic, building it fails early when its
+    #tables are missing
+    informed = any(engine in puzzle.heuristic_modes for engine in engines)
+    specs = {}
+    for name in sets:
+        if name in SETS:
+            specs[name] = set_heuristic(name, heuristic) if informed else heuristic or SET_HEURISTICS[name]
+            if informed:
+                heuristics.get_heuristic(specs[name], 3 if name == "8-puzzle" else 4)
+    report = {
+        "meta" : {
+            "seed"        : seed,
+            "per_band"    : per_band,
+            "count"       : count,
+            "heuristics"  : specs,
+            "node_budget" : node_budget,
+            "time_budget" : time_budget,
+            "repeat"      : repeat,
+            "isolated"    : isolated,
+            "python"      : platform.python_version(),
+            "platform"    : platform.platform(),
+            "cpus"        : os.cpu_count(),
+            "commit"      : git_commit(),
+            "date"        : time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results" : [],
+    }
+    for name in sets:
+        boards = instance_set(name, seed, per_band, count, korf)
+        for engine in engines:
+            if not all_pairs and not handles(engine, name):
+                continue
+            for index, board in enumerate(boards):
+                task = {
+                    "engine"      : engine,
+                    "board"       : board,
+                    "heuristic"   : specs[name] if engine in puzzle.heuristic_modes else "manhattan",
+                    "node_budget" : node_budget,
+                    "time_budget" : time_budget,
+                    "repeat"      : repeat,
+                }
+                measures = measure_isolated(task) if isolated else measure(task)
+                entry = {"engine" : engine, "set" : name, "index" : index, "board" : board}
+                entry.update(measures)
+                report["results"].append(entry)
+                print("%-6s %-8s %3d : %-15s %8.3f s %10s nodes %8s moves" % (
+                    engine, name, index, entry["status"], entry.get("seconds", 0.0),
+                    entry.get("nodes_expanded", "-"), entry.get("cost", "-")), file=out)
+    return report
+
+def summarize(results, keys=None):
+    """
+    Totals per (engine, set) over the boards solved by both runs.
+    :param keys->set : (engine, set, index) of the boards to count, None for every solved board
+    :return dict (engine, set) -> dict of totals
+    """
+    summary = {}
+    for entry in results:
+        key = (entry["engine"], entry["set"], entry["index"])
+        if entry["status"] != "solved" or (keys is not None and key not in keys):
+            continue
+        totals = summary.setdefault((entry["engine"], entry["set"]), {
+            "boards" : 0, "seconds" : 0.0, "nodes_expanded" : 0, "peak_rss_kb" : 0.0, "cost" : 0})
+        totals["boards"]         += 1
+        totals["seconds"]        += entry["seconds"]
+        totals["nodes_expanded"] += entry["nodes_expanded"]
+        totals["peak_rss_kb"]     = max(totals["peak_rss_kb"], entry["peak_rss_kb"])
+        totals["cost"]           += entry["cost"]
+    for totals in summary.values():
+        totals["nodes_per_second"] = totals["nodes_expanded"]/totals["seconds"] if totals["seconds"] > 0 else 0.0
+    return summary
+
+def compare(baseline, current, threshold=0.1, out=sys.stdout):
+    """
+    Flags what got worse from baseline to current by more than threshold:
+    time, nodes expanded and peak memory going up, nodes per second going
+    down, longer solutions, and boards no longer solved.
+    :return list of regressions, as strings
+    """
+    def statuses(report):
+        return {(entry["engine"], entry["set"], entry["index"]) : entry["status"] for entry in report["results"]}
+
+    boards = {(entry["engine"], entry["set"], entry["index"]) : entry["board"] for entry in baseline["results"]}
+    for entry in current["results"]:
+        if boards.get((entry["engine"], entry["set"], entry["index"]), entry["board"]) != entry["board"]:
+            raise Exception("The reports were run on different boards, check their seeds : ", entry["set"])
+
+    before, after = statuses(baseline), statuses(current)
+    regressions = ["%s %s board %d is no longer solved" % key for key in sorted(before)
+                   if before[key] == "solved" and after.get(key, "solved") != "solved"]
+    both = set(key for key in before if before[key] == after.get(key) == "solved")
+    old, new = summarize(baseline["results"], both), summarize(current["results"], both)
+    print("%-6s %-8s %6s %22s %26s %22s %22s" % ("engine", "set", "boards", "seconds", "nodes/s", "peak KB", "moves"), file=out)
+    for key in sorted(old):
+        a, b = old[key], new[key]
+        worse = []
+        if a["seconds"] >= MIN_SECONDS and b["seconds"] > a["seconds"]*(1 + threshold):
+            worse.append("time +%.0f%%" % (100*(b["seconds"]/a["seconds"] - 1)))
+        if a["seconds"] >= MIN_SECONDS and b["nodes_per_second"] < a["nodes_per_second"]*(1 - threshold):
+            worse.append("nodes/s -%.0f%%" % (100*(1 - b["nodes_per_second"]/a["nodes_per_second"])))
+        if b["nodes_expanded"] > a["nodes_expanded"]*(1 + threshold):
+            worse.append("nodes expanded +%.0f%%" % (100*(b["nodes_expanded"]/max(a["nodes_expanded"], 1) - 1)))
+        if b["peak_rss_kb"] > a["peak_rss_kb"]*(1 + threshold):
+            worse.append("peak memory +%.0f%%" % (100*(b["peak_rss_kb"]/a["peak_rss_kb"] - 1)))
+        if b["cost"] > a["cost"]:
+            worse.append("%d more moves" % (b["cost"] - a["cost"]))
+        regressions.extend("%s %s : %s" % (key[0], key[1], text) for text in worse)
+
+        print("%-6s %-8s %6d %10.3f -> %9.3f %12.0f -> %11.0f %10.0f -> %9.0f %10d -> %9d%s" % (
+            key[0], key[1], a["boards"], a["seconds"], b["seconds"], a["nodes_per_second"], b["nodes_per_second"],
+            a["peak_rss_kb"], b["peak_rss_kb"], a["cost"], b["cost"], "  REGRESSION" if worse else ""), file=out)
+    return regressions
+
+class ListState(object):
+    """
+        Board as the original PuzzleState stored it: a list copied and
+        validated for every child, the blank found with index().
+    """
+    def __init__(self, config, n, parent=None, action="Initial", cost=0):
+        if n*n != len(config) or n < 2:
+            raise Exception("The length of config is not correct!")
+        if set(config) != set(range(n*n)):
+            raise Exception("Config contains invalid/duplicate entries : ", config)
+
+        self.n        = n
+        self.cost     = cost
+        self.parent   = parent
+        self.action   = action
+        self.config   = config
+        self.blank_index = config.index(0)//n , config.index(0)%n
+
+    def move(self, row_new, col_new, action):
+        row, col = self.blank_index
+        if not (0 <= row_new < self.n and 0 <= col_new < self.n):
+            return None
+        new_config = list(self.config)
+        new_config[col + row*self.n] = new_config[col_new + row_new*self.n]
+        new_config[col_new + row_new*self.n] = 0
+        return ListState(new_config, self.n, self, action, self.cost + 1)
+
+    def expand(self):
+        """children in order of UDLR"""
+        row, col = self.blank_index
+        children = [self.move(row - 1, col, "Up"), self.move(row + 1, col, "Down"),
+                    self.move(row, col - 1, "Left"), self.move(row, col + 1, "Right")]
+        return [state for state in children if state is not None]
+
+def successors_rate(n, seconds, seed=0, out=sys.stdout):
+    """
+    Nodes generated per second by a random walk expanding every state it
+    visits, with the list based states and with PuzzleState.successors().
+    """
+    rng = random.Random(seed)
+    config = instances.random_board(n, rng)
+
+    generators = [
+        ("list states", ListState, lambda state: state.expand()),
+        ("successors", PuzzleState, lambda state: state.successors()),
+        ("pruned", PuzzleState, lambda state: state.successors(prune=True)),
+    ]
+    rates = {}
+    for name, make, generate in generators:
+        state = make(list(config), n)
+        generated = 0
+        start_time = time.time()
+        while time.time() - start_time < seconds:
+            for _ in range(1000):
+                children = generate(state)
+                generated += len(children)
+                state = rng.choice(children)
+                state.parent = None
+        rates[name] = generated/(time.time() - start_time)
+        print("%-14s %10.0f nodes/s" % (name, rates[name]), file=out)
+    return rates
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search modes over fixed instance sets")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    runner = subparsers.add_parser("run", help="run the benchmarks and write a JSON report")
+    runner.add_argument("--engines", default="bfs,dfs,ast", help="search modes, comma separated, or 'all'")
+    runner.add_argument("--sets", default="8-puzzle,4x4", help="instance sets among %s" % ", ".join(SETS))
+    runner.add_argument("--output", default="benchmark.json", help="JSON report")
+    runner.add_argument("--seed", type=int, default=1, help="seed of the 8-puzzle and 4x4 boards")
+    runner.add_argument("--per-band", type=int, default=2, help="8-puzzle boards per band of depths")
+    runner.add_argument("--count", type=int, default=10, help="number of 4x4 boards")
+    runner.add_argument("--korf", default=KORF_FILE, help="file of Korf's 100 instances, one board per line")
+    runner.add_argument("--heuristic", help="heuristic of every set, by default manhattan, and pdb on korf100")
+    runner.add_argument("--time-budget", type=float, default=60, help="seconds allowed per board")
+    runner.add_argument("--node-budget", type=int, help="nodes expanded allowed per board")
+    runner.add_argument("--repeat", type=int, default=1, help="runs per board, the fastest one is kept")
+    runner.add_argument("--in-process", action="store_true",
+                        help="solve in this process, faster but the peak memory is that of the whole run")
+    runner.add_argument("--all-pairs", action="store_true", help="also run engines on sets they are not expected to finish")
+
+    comparer = subparsers.add_parser("compare", help="flag regressions of a report against a baseline")
+    comparer.add_argument("baseline")
+    comparer.add_argument("current")
+    comparer.add_argument("--threshold", type=float, default=0.1, help="relative change tolerated, 0.1 is 10%%")
+    successors = subparsers.add_parser("successors", help="nodes generated per second by the state expansion")
+    successors.add_argument("--size", type=int, default=3, help="board size n of the n*n puzzle")
+    successors.add_argument("--seconds", type=float, default=2.0, help="seconds per way of expanding")
+    args = parser.parse_args()
+
+    if args.command == "successors":
+        successors_rate(args.size, args.seconds)
+    elif args.command == "run":
+        engines = sorted(puzzle.search_modes) if args.engines == "all" else args.engines.lower().split(",")
+        report = run(engines, args.sets.split(","), args.seed, args.per_band, args.count, args.korf, args.heuristic,
+                     args.node_budget, args.time_budget, args.repeat, not args.in_process, args.all_pairs)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print("%d results written to %s" % (len(report["results"]), args.output), file=sys.stderr)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
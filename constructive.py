@@ -0,0 +1,323 @@
+"""
+Constructive solver for boards of any size.
+
+The board is turned by 180 degrees, so the blank's home is the bottom
+right corner, and is then built up the usual way: the rows from the top
+down until two are left, then the last two rows column by column, and
+finally the 2x2 corner. Every tile but the last two of a line is slid home
+one step at a time, the blank going around it. The last two tiles of a
+line and the corner are finished with a breadth first search of a 3x2,
+2x3 or 2x2 window around them, in which the other tiles are
+interchangeable, so no macro sequence has to be written out by hand.
+
+The solutions are far from optimal but take polynomial time, a 10x10 board
+is solved in milliseconds. shorten() optionally makes them shorter by
+cancelling moves undone right away and re-solving short windows of the
+path optimally:
+
+    python puzzle.py macro <board>
+    python puzzle.py macro <board> --shorten
+    python constructive.py --size 10 --shorten
+"""
+from __future__ import print_function
+
+import time
+import random
+import argparse
+from collections import deque
+
+import ranking
+
+#moves of the board turned by 180 degrees
+ROTATED_ACTIONS = {"Up" : "Down", "Down" : "Up", "Left" : "Right", "Right" : "Left"}
+
+INVERSE_ACTIONS = ROTATED_ACTIONS
+
+#length of the pieces of a path shorten() re-solves, and expansions allowed per piece
+WINDOW = 12
+WINDOW_BUDGET = 2000
+
+
+class Builder(object):
+    """
+        Board turned by 180 degrees: the tiles are placed from the top left
+        and the blank ends in the bottom right corner. Keeps the moves made.
+    """
+    def __init__(self, config, n):
+        """
+        :param config->List : board configuration, 0 is the blank
+        :param n->int : Size of the board
+        """
+        size = n*n
+        self.n     = n
+        self.blank = size - 1
+        # cell q of the turned board is cell size-1-q of the board, tile t is renamed size-1-t
+        self.cells = [size - 1 - config[size - 1 - q] for q in range(size)]
+        self.where = [0]*size
+        for q, tile in enumerate(self.cells):
+            self.where[tile] = q
+        self.locked = bytearray(size)
+        self.moves  = []
+
+        self.offsets = {-n : "Up", n : "Down", -1 : "Left", 1 : "Right"}
+        self.neighbours = []
+        for q in range(size):
+            row, col = divmod(q, n)
+            self.neighbours.append([q + offset for offset, ok in
+                                    ((-n, row > 0), (n, row < n - 1), (-1, col > 0), (1, col < n - 1)) if ok])
+
+    def slide(self, target):
+        """moves the blank to the neighbouring cell target"""
+        blank = self.where[self.blank]
+        tile = self.cells[target]
+        self.cells[blank], self.cells[target] = tile, self.blank
+        self.where[tile], self.where[self.blank] = blank, target
+        self.moves.append(self.offsets[target - blank])
+
+    def route(self, start, targets, avoid=None):
+        """
+        Shortest walk over the free cells from start to the nearest cell of targets.
+        :param avoid->int : one more cell not to cross
+        :return List of the cells after start
+        """
+        if start in targets:
+            return []
+        parents = {start : None}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            for neighbour in self.neighbours[cell]:
+                if neighbour in parents or self.locked[neighbour] or neighbour == avoid:
+                    continue
+                parents[neighbour] = cell
+                if neighbour in targets:
+                    path = [neighbour]
+                    while parents[path[-1]] != start:
+                        path.append(parents[path[-1]])
+                    path.reverse()
+                    return path
+                queue.append(neighbour)
+        raise Exception("No free way to the target cells : ", sorted(targets))
+
+    def blank_to(self, targets, avoid=None):
+        for cell in self.route(self.where[self.blank], targets, avoid):
+            self.slide(cell)
+
+    def tile_to(self, tile, targets):
+        """slides tile to the nearest cell of targets, the blank going around it"""
+        for cell in self.route(self.where[tile], targets):
+            self.blank_to((cell,), avoid=self.where[tile])
+            self.slide(self.where[tile])
+
+    def place(self, tile):
+        """slides tile home and locks it there"""
+        self.tile_to(tile, (tile,))
+        self.locked[tile] = 1
+
+    def finish_window(self, window, tiles):
+        """
+        Brings tiles home with a breadth first search of the blank moves
+        inside window, where any other tile may end up anywhere.
+        :param window->List : cells holding the blank and tiles, and a few more
+        """
+        window = set(window)
+        for tile in tiles:
+            self.locked[self.where[tile]] = 1
+        self.blank_to(window)
+        for tile in tiles:
+            self.locked[self.where[tile]] = 0
+
+        #state: cell of the blank, then of every tile
+        goal = tuple(tiles)
+        start = (self.where[self.blank],) + tuple(self.where[tile] for tile in tiles)
+        parents = {start : None}
+        queue = deque([start])
+        while queue:
+            state = queue.popleft()
+            if state[1:] == goal:
+                break
+            blank = state[0]
+            for cell in self.neighbours[blank]:
+                if cell not in window:
+                    continue
+                child = (cell,) + tuple(blank if position == cell else position for position in state[1:])
+                if child not in parents:
+                    parents[child] = state
+                    queue.append(child)
+        else:
+            raise Exception("Tiles can not be brought home inside the window : ", tiles)
+
+        cells = []
+        while parents[state] is not None:
+            cells.append(state[0])
+            state = parents[state]
+        for cell in reversed(cells):
+            self.slide(cell)
+        for tile in tiles:
+            self.locked[tile] = 1
+
+    def solve(self):
+        n = self.n
+        for row in range(n - 2):
+            for col in range(n - 2):
+                self.place(row*n + col)
+            #the last two tiles of the row, in the 3x2 block below them
+            first, second = row*n + n - 2, row*n + n - 1
+            self.place(first)
+            window = [r*n + c for r in range(row, row + 3) for c in (n - 2, n - 1)]
+            self.tile_to(second, set(window))
+            self.finish_window(window, [first, second])
+
+        for col in range(n - 2):
+            #the last two rows are finished a column at a time, in the 2x3 block right of it
+            first, second = (n - 2)*n + col, (n - 1)*n + col
+            self.place(first)
+            window = [r*n + c for r in (n - 2, n - 1) for c in range(col, col + 3)]
+            self.tile_to(second, set(window))
+            self.finish_window(window, [first, second])
+
+        corner = [r*n + c for r in (n - 2, n - 1) for c in (n - 2, n - 1)]
+        self.finish_window(corner, corner[:3])
+
+def solve_rows(config, n):
+    """
+    :param config->List : board configuration, 0 is the blank
+    :param n->int : Size of the board
+    :return list of actions solving config, None if it is not reachable
+    """
+    if not ranking.is_reachable(config, n):
+        return None
+    builder = Builder(config, n)
+    builder.solve()
+    return [ROTATED_ACTIONS[move] for move in builder.moves]
+
+def cancel_inverses(path):
+    """removes every move followed by the move undoing it"""
+    kept = []
+    for action in path:
+        if kept and INVERSE_ACTIONS[kept[-1]] == action:
+            kept.pop()
+        else:
+            kept.append(action)
+    return kept
+
+def shortest_between(cells, blank, target, n, limit, budget):
+    """
+    IDA* with the manhattan distance to target for a path shorter than limit
+    from cells to target.
+    :param cells->List : board configuration, changed during the search and restored
+    :param target->dict : tile -> cell in the target board of every tile that moves, the blank included
+    :return list of actions, None if there is none or the budget ran out
+    """
+    home = dict(target)
+    blank_goal = home.pop(0)
+    moves = {-n : "Up", n : "Down", -1 : "Left", 1 : "Right"}
+
+    def distance(tile, cell):
+        goal = home.get(tile)
+        if goal is None:
+            #a tile left alone by target is in its target cell until it moves first
+            home[tile] = goal = cell
+        return abs(goal//n - cell//n) + abs(goal%n - cell%n)
+
+    h = sum(distance(cells[cell], cell) for cell in target.values() if cells[cell] != 0)
+    path = []
+    expanded = [0]
+
+    def bounded(blank, g, h, previous, threshold):
+        if h == 0 and blank == blank_goal:
+            return True
+        if g + h > threshold or expanded[0] >= budget:
+            return False
+        expanded[0] += 1
+        row, col = divmod(blank, n)
+        for offset, ok in ((-n, row > 0), (n, row < n - 1), (-1, col > 0), (1, col < n - 1)):
+            if not ok or offset == -previous:
+                continue
+            cell = blank + offset
+            tile = cells[cell]
+            child_h = h - distance(tile, cell) + distance(tile, blank)
+            cells[blank], cells[cell] = tile, 0
+            path.append(moves[offset])
+            found = bounded(cell, g + 1, child_h, offset, threshold)
+            cells[blank], cells[cell] = 0, tile
+            if found:
+                return True
+            path.pop()
+        return False
+
+    # every move changes the parity of the blank's distance to its target cell
+    parity = (abs(blank//n - blank_goal//n) + abs(blank%n - blank_goal%n)) % 2
+    for threshold in range(h, limit):
+        if threshold % 2 != parity:
+            continue
+        if bounded(blank, 0, h, 0, threshold):
+            return list(path)
+        if expanded[0] >= budget:
+            return None
+    return None
+
+def shorten(config, n, path, window=WINDOW, budget=WINDOW_BUDGET):
+    """
+    Shorter solution of config: moves undone right away are cancelled, then
+    the path is cut in pieces of window moves, twice with the cuts shifted
+    by half a window, and a piece is replaced by an optimal one when that is
+    shorter, found by IDA* with at most budget expansions.
+    """
+    offsets = {"Up" : -n, "Down" : n, "Left" : -1, "Right" : 1}
+    path = cancel_inverses(path)
+    for first in (window, window//2):
+        cells = list(config)
+        blank = cells.index(0)
+        shortened = []
+        start = 0
+        while start < len(path):
+            piece = path[start:start + (first if start == 0 else window)]
+            start += len(piece)
+
+            #the cells the piece changes, and what they hold after it
+            after = list(cells)
+            position = blank
+            touched = [blank]
+            for action in piece:
+                cell = position + offsets[action]
+                after[position], after[cell] = after[cell], 0
+                position = cell
+                touched.append(cell)
+            target = {after[cell] : cell for cell in set(touched) if after[cell] != cells[cell]}
+            target[0] = position
+
+            if len(piece) > 2:
+                better = shortest_between(cells, blank, target, n, len(piece), budget)
+                if better is not None:
+                    piece = better
+            shortened.extend(piece)
+            cells, blank = after, position
+        path = cancel_inverses(shortened)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve random boards with the constructive solver")
+    parser.add_argument("--size", type=int, default=10, help="board size n of the n*n puzzle")
+    parser.add_argument("--count", type=int, default=10, help="number of boards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shorten", action="store_true", help="also time the shortening pass")
+    args = parser.parse_args()
+
+    #instances imports puzzle, which imports this module
+    import instances
+
+    rng = random.Random(args.seed)
+    n = args.size
+    for _ in range(args.count):
+        config = instances.random_board(n, rng)
+        start_time = time.time()
+        path = solve_rows(config, n)
+        line = "%dx%d : %6d moves in %7.3f second(s)" % (n, n, len(path), time.time() - start_time)
+        if args.shorten:
+            start_time = time.time()
+            line += ", shortened to %6d in %7.3f second(s)" % (len(shorten(config, n, path)), time.time() - start_time)
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+External-memory breadth first search with delayed duplicate detection.
+
+Each BFS layer is a file of sorted, distinct packed boards. A layer is
+expanded by streaming its file. The children are collected in a buffer of
+bounded size that is sorted and written out as a run whenever it fills.
+The runs are then merged. Duplicates among them, and boards of the two
+previous layers, are dropped during the merge, so no set of boards is
+ever held in memory. A checkpoint is written after every layer, and an
+interrupted run resumes from the last complete layer:
+
+    python external_bfs.py run --size 3 --dir /tmp/bfs3
+    python external_bfs.py run --size 4 --dir /data/bfs4 --buffer 50000000 --resume
+    python puzzle.py ebfs 8,6,7,2,5,4,3,0,1
+    python puzzle.py ebfs 8,6,7,2,5,4,3,0,1 --layers-dir /data/ebfs
+
+Layers are kept on disk, and a solution is traced back by looking up one
+neighbour per layer with a binary search of the layer file.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import heapq
+import shutil
+import argparse
+from array import array
+
+from PuzzleState import tile_bits, encode_config, neighbour_table
+
+#boards held in memory while a layer is expanded
+DEFAULT_BUFFER = 1000000
+
+#records read from a file at a time
+CHUNK = 65536
+
+CHECKPOINT = "checkpoint.json"
+
+#records are little endian on every host, the array module writes the host's order
+SWAP_BYTES = sys.byteorder == "big"
+
+def record_width(n):
+    """bytes per board on disk, 8 up to 4x4 so the array module can be used"""
+    return max(8, (n*n*tile_bits(n) + 7)//8)
+
+def write_records(f, records, width):
+    """writes sorted boards to an open binary file, little endian"""
+    if width == 8:
+        records = array('Q', records)
+        if SWAP_BYTES:
+            records.byteswap()
+        records.tofile(f)
+    else:
+        f.write(b"".join(record.to_bytes(width, "little") for record in records))
+
+def read_records(path, width):
+    """yields the boards of a file in order, reading CHUNK of them at a time"""
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(CHUNK*width)
+            if not data:
+                return
+            if width == 8:
+                records = array('Q', data)
+                if SWAP_BYTES:
+                    records.byteswap()
+                for record in records:
+                    yield record
+            else:
+                for i in range(0, len(data), width):
+                    yield int.from_bytes(data[i:i + width], "little")
+
+def file_contains(path, width, record):
+    """binary search of a sorted record file"""
+    with open(path, "rb") as f:
+        low, high = 0, os.path.getsize(path)//width
+        while low < high:
+            middle = (low + high)//2
+            f.seek(middle*width)
+            value = int.from_bytes(f.read(width), "little")
+            if value == record:
+                return True
+            if value < record:
+                low = middle + 1
+            else:
+                high = middle
+    return False
+
+def merge_new(runs, excluded):
+    """
+    Yields every board of the sorted runs once, leaving out those of the
+    sorted excluded streams.
+    """
+    excluded = [iter(stream) for stream in excluded]
+    heads = [next(stream, None) for stream in excluded]
+    last = None
+    for record in heapq.merge(*runs):
+        if record == last:
+            continue
+        last = record
+        seen = False
+        for i, stream in enumerate(excluded):
+            while heads[i] is not None and heads[i] < record:
+                heads[i] = next(stream, None)
+            if heads[i] == record:
+                seen = True
+        if not seen:
+            yield record
+
+
+class ExternalBFS(object):
+    """
+        Breadth first search from a root board whose layers live in a
+        directory as layer-<depth>.bin, with a JSON checkpoint.
+    """
+    def __init__(self, n, directory, buffer_size=DEFAULT_BUFFER):
+        """
+        :param n->int : Size of the board
+        :param directory->string : folder of the layer files and the checkpoint
+        :param buffer_size->int : boards kept in memory before a run is written
+        """
+        self.n           = n
+        self.directory   = directory
+        self.buffer_size = buffer_size
+        self.width       = record_width(n)
+        self.w           = tile_bits(n)
+
+        #the lowest empty field of board - ones has its top bit set in highs
+        self.ones  = sum(1 << (i*self.w) for i in range(n*n))
+        self.highs = self.ones << (self.w - 1)
+
+        #per layer: number of boards, children generated to build it, seconds spent
+        self.counts    = []
+        self.generated = []
+        self.seconds   = []
+        self.root      = None
+
+    def layer_path(self, depth):
+        return os.path.join(self.directory, "layer-%03d.bin" % depth)
+
+    def run_path(self, i):
+        return os.path.join(self.directory, "runs", "run-%05d.bin" % i)
+
+    def blank(self, board):
+        """index of the empty field of a packed board"""
+        zero = (board - self.ones) & ~board & self.highs
+        return ((zero & -zero).bit_length() - 1)//self.w
+
+    def children(self, board):
+        """(child board, index of the blank in the parent, index of the moved tile) for every move"""
+        w = self.w
+        mask = (1 << w) - 1
+        blank = self.blank(board)
+        for target, _ in neighbour_table(self.n)[blank]:
+            tile = (board >> (target*w)) & mask
+            yield board - (tile << (target*w)) + (tile << (blank*w)), blank, target
+
+    def start(self, config):
+        """starts a new search, removing the files of an earlier one in the directory"""
+        if os.path.isdir(self.directory):
+            self.clear()
+        else:
+            os.makedirs(self.directory)
+        self.root = encode_config(config, self.n)
+        with open(self.layer_path(0), "wb") as f:
+            write_records(f, [self.root], self.width)
+        self.counts, self.generated, self.seconds = [1], [0], [0.0]
+        self.save()
+
+    def clear(self):
+        """
+        Removes the layer files, the runs and the checkpoint of an earlier search.
+        Nothing else in the directory is touched, and a non-empty directory
+        without a checkpoint is refused since it was not written by this tool.
+        """
+        names = os.listdir(self.directory)
+        if names and CHECKPOINT not in names:
+            raise Exception("Not an external BFS directory, refusing to write into it : ", self.directory)
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name == "runs" and os.path.isdir(path):
+                shutil.rmtree(path)
+            elif name in (CHECKPOINT, CHECKPOINT + ".tmp") or (name.startswith("layer-") and name.endswith(".bin")):
+                os.remove(path)
+
+    def save(self):
+        """writes the checkpoint, atomically so an interruption leaves the previous one"""
+        state = {
+            "n"         : self.n,
+            "root"      : self.root,
+            "counts"    : self.counts,
+            "generated" : self.generated,
+            "seconds"   : self.seconds,
+        }
+        path = os.path.join(self.directory, CHECKPOINT)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    def resumable(self, root):
+        """True when the directory holds a checkpoint of a search of this board size from root"""
+        path = os.path.join(self.directory, CHECKPOINT)
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            state = json.load(f)
+        return state["n"] == self.n and state["root"] == root
+
+    def resume(self):
+        """loads the checkpoint, layers written after it are discarded"""
+        path = os.path.join(self.directory, CHECKPOINT)
+        if not os.path.exists(path):
+            raise Exception("No external BFS checkpoint found : ", path)
+        with open(path) as f:
+            state = json.load(f)
+        if state["n"] != self.n:
+            raise Exception("Checkpoint is for another board size : ", path)
+        self.root      = state["root"]
+        self.counts    = state["counts"]
+        self.generated = state["generated"]
+        self.seconds   = state["seconds"]
+        if os.path.exists(self.layer_path(len(self.counts))):
+            os.remove(self.layer_path(len(self.counts)))
+
+    def finished(self):
+        return self.counts[-1] == 0
+
+    def expand(self, target=None):
+        """
+        Builds the next layer from the last one.
+        :param target->int : packed board to look for in the new layer
+        :return True if target is in the new layer
+        """
+        start_time = time.time()
+        depth = len(self.counts) - 1
+        runs_directory = os.path.join(self.directory, "runs")
+        if os.path.isdir(runs_directory):
+            shutil.rmtree(runs_directory)
+        os.makedirs(runs_directory)
+
+        # sorted runs of at most buffer_size distinct children
+        runs, buffer, generated = [], [], 0
+        for board in read_records(self.layer_path(depth), self.width):
+            for child, _, _ in self.children(board):
+                buffer.append(child)
+                generated += 1
+            if len(buffer) >= self.buffer_size:
+                runs.append(self.write_run(len(runs), buffer))
+                buffer = []
+        if buffer:
+            runs.append(self.write_run(len(runs), buffer))
+
+        excluded = [read_records(self.layer_path(d), self.width) for d in (depth - 1, depth) if d >= 0]
+        streams = [read_records(path, self.width) for path in runs]
+        found, count, chunk = False, 0, []
+        path = self.layer_path(depth + 1)
+        with open(path + ".tmp", "wb") as f:
+            for record in merge_new(streams, excluded):
+                if record == target:
+                    found = True
+                chunk.append(record)
+                if len(chunk) >= CHUNK:
+                    write_records(f, chunk, self.width)
+                    count += len(chunk)
+                    chunk = []
+            write_records(f, chunk, self.width)
+            count += len(chunk)
+        os.replace(path + ".tmp", path)
+        shutil.rmtree(runs_directory)
+
+        self.counts.append(count)
+        self.generated.append(generated)
+        self.seconds.append(time.time() - start_time)
+        self.save()
+        return found
+
+    def write_run(self, i, buffer):
+        buffer.sort()
+        path = self.run_path(i)
+        with open(path, "wb") as f:
+            previous = None
+            distinct = []
+            for record in buffer:
+                if record != previous:
+                    distinct.append(record)
+                    previous = record
+            write_records(f, distinct, self.width)
+        return path
+
+    def path_to(self, board, depth):
+        """
+        Actions leading from the root to a board of layer depth, tracing back
+        one layer at a time through a neighbour found in the layer above.
+        """
+        n = self.n
+        path = []
+        for d in range(depth, 0, -1):
+            for parent, blank, target in self.children(board):
+                if file_contains(self.layer_path(d - 1), self.width, parent):
+                    #in parent the blank sits at target and moves to blank
+                    offset = blank - target
+                    path.append({-n : "Up", n : "Down", -1 : "Left", 1 : "Right"}[offset])
+                    board = parent
+                    break
+        path.reverse()
+        return path
+
+def run(n, directory, buffer_size, resume, max_depth=None):
+    """enumerates every board reachable from the goal, printing one line per layer"""
+    bfs = ExternalBFS(n, directory, buffer_size)
+    if resume:
+        bfs.resume()
+        print("resuming at depth %d" % (len(bfs.counts) - 1))
+    else:
+        bfs.start(list(range(n*n)))
+
+    print("depth %3d : %12d boards" % (0, bfs.counts[0]))
+    for depth in range(1, len(bfs.counts)):
+        print("depth %3d : %12d boards, %12d generated, %9.3f second(s) (checkpoint)" % (depth, bfs.counts[depth], bfs.generated[depth], bfs.seconds[depth]))
+    while not bfs.finished() and (max_depth is None or len(bfs.counts) <= max_depth):
+        bfs.expand()
+        depth = len(bfs.counts) - 1
+        print("depth %3d : %12d boards, %12d generated, %9.3f second(s)" % (depth, bfs.counts[depth], bfs.generated[depth], bfs.seconds[depth]))
+        sys.stdout.flush()
+    depth = len(bfs.counts) - (2 if bfs.finished() else 1)
+    print("%d boards up to depth %d, %.3f second(s)" % (sum(bfs.counts), depth, sum(bfs.seconds)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Breadth first search of a whole puzzle space on disk")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--size", type=int, default=3, help="board size n of the n*n puzzle")
+    parser.add_argument("--dir", required=True, help="folder of the layer files and the checkpoint")
+    parser.add_argument("--buffer", type=int, default=DEFAULT_BUFFER, help="boards held in memory before a run is written")
+    parser.add_argument("--max-depth", type=int, help="stop after this layer")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint in --dir")
+    args = parser.parse_args()
+    run(args.size, args.dir, args.buffer, args.resume, args.max_depth)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Frontiers (open lists) of the search engines.
+
+The classes of the queue module take a lock on every put and get, which a
+single threaded search does not need. Every frontier here offers push(),
+pop() and len():
+
+    FifoFrontier    deque, for breadth first search
+    LifoFrontier    list, for depth first search
+    HeapFrontier    binary heap ordered like PuzzleState.__lt__
+    BucketFrontier  one bucket per integer f = cost + h, popped from the
+                    smallest non empty bucket; ties are broken LIFO or in
+                    favour of the deepest state
+
+A micro-benchmark against the queue module classes:
+
+    python frontier.py --count 200000
+"""
+from __future__ import print_function
+
+import time
+import heapq
+import random
+import argparse
+import queue as Q
+from collections import deque
+
+class FifoFrontier(object):
+    """first in, first out"""
+    def __init__(self):
+        self.items = deque()
+
+    def push(self, state):
+        self.items.append(state)
+
+    def pop(self):
+        return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class LifoFrontier(object):
+    """last in, first out"""
+    def __init__(self):
+        self.items = []
+
+    def push(self, state):
+        self.items.append(state)
+
+    def pop(self):
+        return self.items.pop()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class HeapFrontier(object):
+    """
+        Binary heap popping the state with the smallest sort_key, in the same
+        order as Q.PriorityQueue. The key is stored next to the state so most
+        comparisons are between tuples instead of calls to PuzzleState.__lt__.
+    """
+    def __init__(self):
+        self.items = []
+
+    def push(self, state):
+        heapq.heappush(self.items, (state.sort_key, state))
+
+    def pop(self):
+        return heapq.heappop(self.items)[1]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class BucketFrontier(object):
+    """
+        Bucket priority queue for integer f values. Pushing is O(1), popping
+        moves a cursor up to the smallest non empty bucket, and f only grows
+        during A* with a consistent heuristic.
+    """
+    def __init__(self, tie_break="lifo"):
+        """
+        :param tie_break->string : 'lifo' pops the state pushed last among equal f,
+                                   'deep' pops the one with the highest cost g
+        """
+        if tie_break not in ("lifo", "deep"):
+            raise Exception("Unknown tie break, choose from lifo or deep : ", tie_break)
+        self.deep    = tie_break == "deep"
+        self.buckets = []
+        self.lowest  = 0
+        self.count   = 0
+
+    def push(self, state):
+        f = state.cost + state.h
+        while len(self.buckets) <= f:
+            self.buckets.append([])
+        bucket = self.buckets[f]
+        if self.deep:
+            #one list per cost g inside the bucket
+            while len(bucket) <= state.cost:
+                bucket.append([])
+            bucket = bucket[state.cost]
+        bucket.append(state)
+        if f < self.lowest:
+            self.lowest = f
+        self.count += 1
+
+    def pop(self):
+        if not self.count:
+            raise IndexError("pop from an empty frontier")
+        while not self.buckets[self.lowest]:
+            self.lowest += 1
+        bucket = self.buckets[self.lowest]
+        self.count -= 1
+        if not self.deep:
+            return bucket.pop()
+
+        state = bucket[-1].pop()
+        #drop the emptied lists of the highest costs
+        while bucket and not bucket[-1]:
+            bucket.pop()
+        return state
+
+    def __len__(self):
+        return self.count
+
+# name -> factory, the priority queues are selectable with --priority-queue
+FRONTIERS = {
+    "fifo"        : FifoFrontier,
+    "lifo"        : LifoFrontier,
+    "heap"        : HeapFrontier,
+    "bucket"      : lambda: BucketFrontier("lifo"),
+    "bucket-deep" : lambda: BucketFrontier("deep"),
+}
+
+PRIORITY_QUEUES = ["heap", "bucket", "bucket-deep"]
+
+def make_frontier(kind):
+    """
+    New empty frontier.
+    :param kind->string : one of FRONTIERS
+    """
+    if kind not in FRONTIERS:
+        raise Exception("Unknown frontier, choose from %s : " % ", ".join(sorted(FRONTIERS)), kind)
+    return FRONTIERS[kind]()
+
+
+class BenchmarkItem(object):
+    """stand in for a PuzzleState, only the fields a frontier reads"""
+    __slots__ = ('cost', 'h', 'sort_key')
+
+    def __init__(self, cost, h, order):
+        self.cost     = cost
+        self.h        = h
+        self.sort_key = (cost + h, order)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+def benchmark(kind, items):
+    """seconds to push all items and pop them again"""
+    start_time = time.time()
+    if kind.startswith("Q."):
+        frontier = getattr(Q, kind[2:])()
+        for item in items:
+            frontier.put(item)
+        while not frontier.empty():
+            frontier.get()
+    else:
+        frontier = make_frontier(kind)
+        for item in items:
+            frontier.push(item)
+        while frontier:
+            frontier.pop()
+    return time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Push/pop throughput of the frontiers against the queue module")
+    parser.add_argument("--count", type=int, default=200000, help="items pushed and popped per run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # f values spread like those of an A* search on the 15-puzzle
+    rng = random.Random(args.seed)
+    items = []
+    for _ in range(args.count):
+        cost = rng.randint(0, 50)
+        items.append(BenchmarkItem(cost, rng.randint(0, 60 - cost), rng.randint(0, 3)))
+
+    for baseline, kinds in (("Q.Queue", ["fifo"]), ("Q.LifoQueue", ["lifo"]),
+                            ("Q.PriorityQueue", PRIORITY_QUEUES)):
+        reference = benchmark(baseline, items)
+        print("%-16s %10.0f ops/s" % (baseline, 2*args.count/reference))
+        for kind in kinds:
+            seconds = benchmark(kind, items)
+            print("%-16s %10.0f ops/s  %5.1fx" % (kind, 2*args.count/seconds, reference/seconds))
+
+if __name__ == '__main__':
+    main()
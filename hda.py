@@ -0,0 +1,321 @@
+"""
+Hash distributed A* (HDA*) over worker processes.
+
+Every board has an owner, chosen by a hash of its packed encoding. The
+owner keeps the board's open and closed entries, so the workers share
+nothing but the cost of the best solution found so far (the incumbent).
+A worker that generates a child owned by another worker buffers it and
+sends it over the owner's queue in batches.
+
+Nodes are reopened when reached again with a smaller cost, and a solution
+is only reported once no worker holds a node with f below the incumbent
+and no batch is in flight, so the solution is optimal for an admissible
+heuristic. Termination is detected with two global counters, of batches
+sent and received, read before and after the workers' idle flags.
+
+Used by the 'hda' search mode of puzzle.py:
+
+    python puzzle.py hda <board> --workers 4
+"""
+import os
+import time
+import heapq
+import multiprocessing
+import queue
+
+from PuzzleState import PuzzleState, tile_bits, goal_board, neighbour_table
+
+#children sent to another worker at once
+BATCH_SIZE = 64
+
+#expansions between flushes of partly filled batches and of the shared statistics
+FLUSH_INTERVAL = 256
+
+#expansions between two polls of the inbox
+POLL_EXPANSIONS = 16
+
+#seconds the controller waits between termination checks
+POLL_INTERVAL = 0.005
+
+#seconds a stopped worker gets to exit before it is terminated
+STOP_TIMEOUT = 1.0
+
+#move codes as in PuzzleState.heap_order, the inverse of code c is c ^ 1
+ACTIONS = ["Up", "Down", "Left", "Right"]
+
+def owner(board, workers):
+    """worker owning a board, a multiplicative hash spreads the low bits of the encoding"""
+    return ((hash(board) * 0x9E3779B97F4A7C15) >> 32) % workers
+
+def context():
+    """fork keeps the heuristic, possibly memory-mapped, shared with the workers"""
+    try:
+        return multiprocessing.get_context("fork")
+    except ValueError:
+        return multiprocessing.get_context()
+
+
+class Worker(object):
+    """
+        Open and closed lists of the boards owned by one process.
+    """
+    def __init__(self, index, n, heuristic, shared):
+        self.index     = index
+        self.n         = n
+        self.heuristic = heuristic
+        self.shared    = shared
+        self.workers   = len(shared["inboxes"])
+        self.goal      = goal_board(n)
+
+        #board -> (g, parent board, move code, blank, h) of the cheapest path known
+        self.best     = {}
+        self.open     = []
+        self.outgoing = [[] for _ in range(self.workers)]
+        self.counter  = 0
+
+        self.expanded  = 0
+        self.updated   = 0
+        self.sent      = 0
+        self.received  = 0
+        self.max_depth = 0
+
+    def insert(self, board, blank, g, h, parent, move):
+        """adds a board reached with cost g unless a cheaper path to it is known"""
+        known = self.best.get(board)
+        if known is not None and known[0] <= g:
+            return
+        self.best[board] = (g, parent, move, blank, h)
+        self.counter += 1
+        #ties go to the deepest node, which is closest to a solution
+        heapq.heappush(self.open, (g + h, -g, self.counter, board))
+        if g > self.max_depth:
+            self.max_depth = g
+
+        if board == self.goal:
+            incumbent = self.shared["incumbent"]
+            with incumbent.get_lock():
+                if g < incumbent.value:
+                    incumbent.value = g
+
+    def expand(self, board):
+        """generates the children of board and routes them to their owners"""
+        g, _, move, blank, h = self.best[board]
+        w = tile_bits(self.n)
+        mask = (1 << w) - 1
+        inverse = move ^ 1 if move >= 0 else None
+        for target, action in neighbour_table(self.n)[blank]:
+            code = PuzzleState.heap_order[action]
+            if code == inverse:
+                continue
+            tile = (board >> (target*w)) & mask
+            child = board - (tile << (target*w)) + (tile << (blank*w))
+            child_h = self.heuristic.update(h, child, self.n, tile, target, blank)
+            self.updated += 1
+            destination = owner(child, self.workers)
+            if destination == self.index:
+                self.insert(child, target, g + 1, child_h, board, code)
+            else:
+                self.outgoing[destination].append((child, target, g + 1, child_h, board, code))
+                if len(self.outgoing[destination]) >= BATCH_SIZE:
+                    self.send(destination)
+        self.expanded += 1
+
+    def send(self, destination):
+        batch = self.outgoing[destination]
+        if not batch:
+            return
+        self.outgoing[destination] = []
+        #counted before it can be received
+        with self.shared["sent"].get_lock():
+            self.shared["sent"].value += 1
+        self.sent += 1
+        self.shared["inboxes"][destination].put(("batch", batch))
+
+    def flush(self):
+        for destination in range(self.workers):
+            self.send(destination)
+        self.shared["expanded"][self.index] = self.expanded
+
+    def handle(self, message):
+        """
+        Processes one message of the inbox.
+        :return False once the worker has to stop
+        """
+        kind = message[0]
+        if kind == "batch":
+            self.shared["idle"][self.index] = 0
+            for entry in message[1]:
+                self.insert(*entry)
+            self.received += 1
+            with self.shared["received"].get_lock():
+                self.shared["received"].value += 1
+        elif kind == "trace":
+            _, parent, move, _, _ = self.best[message[1]]
+            self.shared["results"].put(("trace", parent, move))
+        elif kind == "stop":
+            self.shared["results"].put(("stats", self.index, self.expanded, self.sent, self.received, self.max_depth,
+                                        self.updated))
+            return False
+        return True
+
+    def has_work(self):
+        """True when the open list holds a node with f below the incumbent"""
+        incumbent = self.shared["incumbent"].value
+        while self.open:
+            f, negative_g, _, board = self.open[0]
+            if self.best[board][0] != -negative_g:
+                #superseded by a cheaper path
+                heapq.heappop(self.open)
+                continue
+            return f < incumbent
+        return False
+
+    def run(self):
+        inbox = self.shared["inboxes"][self.index]
+        since_flush = 0
+        while True:
+            try:
+                while True:
+                    if not self.handle(inbox.get_nowait()):
+                        return
+            except queue.Empty:
+                pass
+
+            if self.has_work():
+                #the inbox is only polled every few expansions, polling takes a lock
+                for _ in range(POLL_EXPANSIONS):
+                    self.expand(heapq.heappop(self.open)[3])
+                    if not self.has_work():
+                        break
+                since_flush += POLL_EXPANSIONS
+                if since_flush >= FLUSH_INTERVAL:
+                    self.flush()
+                    since_flush = 0
+                continue
+
+            #out of work: send what is buffered, then wait for a message
+            self.flush()
+            since_flush = 0
+            self.shared["idle"][self.index] = 1
+            if not self.handle(inbox.get()):
+                return
+
+def worker_main(index, n, heuristic, shared):
+    Worker(index, n, heuristic, shared).run()
+
+
+class HashDistributedAStar(object):
+    """
+        Controller of an HDA* search, running in the calling process.
+    """
+    def __init__(self, initial_state, workers=None):
+        """
+        :param initial_state->PuzzleState : board to solve, with its heuristic
+        :param workers->int : number of processes, defaults to the number of cores
+        """
+        self.initial = initial_state
+        self.workers = workers or os.cpu_count() or 1
+        ctx = context()
+        self.shared = {
+            "inboxes"   : [ctx.Queue() for _ in range(self.workers)],
+            "results"   : ctx.Queue(),
+            "incumbent" : ctx.Value('d', float('inf')),
+            "sent"      : ctx.Value('q', 0),
+            "received"  : ctx.Value('q', 0),
+            "idle"      : ctx.Array('b', [0]*self.workers, lock=False),
+            "expanded"  : ctx.Array('q', [0]*self.workers, lock=False),
+        }
+        self.processes = [ctx.Process(target=worker_main, args=(i, initial_state.n, initial_state.heuristic, self.shared))
+                          for i in range(self.workers)]
+        self.stats = None
+
+    def start(self):
+        for process in self.processes:
+            process.daemon = True
+            process.start()
+        state = self.initial
+        with self.shared["sent"].get_lock():
+            self.shared["sent"].value += 1
+        self.shared["inboxes"][owner(state.board, self.workers)].put(
+            ("batch", [(state.board, state.blank, 0, state.h, None, PuzzleState.heap_order['Initial'])]))
+
+    def counters(self):
+        return self.shared["sent"].value, self.shared["received"].value
+
+    def finished(self):
+        """
+        Waits a moment, then tells whether the search is over: every worker
+        idle and no batch sent or received while their flags were read.
+        """
+        time.sleep(POLL_INTERVAL)
+        for process in self.processes:
+            if not process.is_alive():
+                raise Exception("HDA* worker process died : ", process.exitcode)
+        before = self.counters()
+        if before[0] != before[1] or not all(self.shared["idle"]):
+            return False
+        return self.counters() == before
+
+    def nodes_expanded(self):
+        """expansions reported by the workers so far"""
+        return sum(self.shared["expanded"])
+
+    def cost(self):
+        """cost of the best solution, None if there is none"""
+        incumbent = self.shared["incumbent"].value
+        return int(incumbent) if incumbent != float('inf') else None
+
+    def path(self):
+        """actions of the best solution, traced back through the owners of its boards"""
+        path = []
+        board = goal_board(self.initial.n)
+        while board != self.initial.board:
+            self.shared["inboxes"][owner(board, self.workers)].put(("trace", board))
+            _, board, move = self.shared["results"].get()
+            path.append(ACTIONS[move])
+        path.reverse()
+        return path
+
+    def stop(self):
+        """
+        Stops the workers, terminating those that do not exit. A worker that
+        died has None in place of its stats.
+        :return List of (expanded, batches sent, batches received, max depth, heuristic updates) per worker
+        """
+        if self.stats is not None:
+            return self.stats
+        for inbox in self.shared["inboxes"]:
+            inbox.put(("stop",))
+        stats = [None]*self.workers
+        pending = set(range(self.workers))
+        while pending:
+            try:
+                message = self.shared["results"].get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                #a worker that died never answers, give up on it once its last messages are read
+                dead = set(i for i in pending if not self.processes[i].is_alive())
+                if dead:
+                    self.drain(stats, pending)
+                    pending -= dead
+                continue
+            if message[0] == "stats":
+                stats[message[1]] = message[2:]
+                pending.discard(message[1])
+        for process in self.processes:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.stats = stats
+        return stats
+
+    def drain(self, stats, pending):
+        """reads the stats already in the results queue without waiting"""
+        while True:
+            try:
+                message = self.shared["results"].get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == "stats":
+                stats[message[1]] = message[2:]
+                pending.discard(message[1])
@@ -0,0 +1,342 @@
+"""
+Registry of the heuristics available to the informed searches.
+
+Every heuristic implements the interface of PuzzleState.ManhattanHeuristic:
+evaluate() scores a board from scratch and update() derives a child's score
+from its parent's after a single tile moved. Heuristics are looked up by a
+spec such as 'manhattan', 'linear-conflict' or 'max(walking-distance,pdb)':
+
+    python heuristics.py 1,3,5,0,4,2,6,7,8
+"""
+from __future__ import print_function
+
+import sys
+import math
+import bisect
+from collections import deque
+
+from PuzzleState import manhattan, tile_bits, encode_config, decode_board
+import pattern_db
+
+_walking_distance_tables = {}
+
+def longest_increasing(sequence):
+    """length of the longest strictly increasing subsequence"""
+    tails = []
+    for value in sequence:
+        i = bisect.bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+        else:
+            tails[i] = value
+    return len(tails)
+
+
+class TargetManhattanHeuristic(object):
+    """
+        Manhattan distance to an arbitrary target board instead of the goal,
+        used by the backward half of bidirectional searches.
+    """
+    name = "manhattan"
+
+    def __init__(self, target, n):
+        """
+        :param target->List : configuration the distance is measured to
+        :param n->int : Size of the board
+        """
+        goal_index = [0]*(n*n)
+        for idx, tile in enumerate(target):
+            goal_index[tile] = idx
+        # table[idx][tile] : distance of tile at idx to its place in target
+        self.table = [[abs(idx//n - goal_index[tile]//n) + abs(idx%n - goal_index[tile]%n) if tile != 0 else 0
+                       for tile in range(n*n)] for idx in range(n*n)]
+
+    def evaluate(self, config, n):
+        return sum(self.table[idx][tile] for idx, tile in enumerate(config))
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        return h - self.table[old_index][tile] + self.table[new_index][tile]
+
+
+class LinearConflictHeuristic(object):
+    """
+        Manhattan distance plus two moves for every tile that has to leave
+        its goal row or column to let another tile of that line pass.
+    """
+    name = "linear-conflict"
+
+    def line_conflicts(self, board, n, line, vertical):
+        """
+        Number of tiles that must leave a row (or a column if vertical), i.e.
+        the tiles in their goal line minus the longest run already in order.
+        """
+        w = tile_bits(n)
+        mask = (1 << w) - 1
+        goals = []
+        for i in range(n):
+            idx = i*n + line if vertical else line*n + i
+            tile = (board >> (idx*w)) & mask
+            if tile == 0:
+                continue
+            if vertical and tile % n == line:
+                goals.append(tile // n)
+            elif not vertical and tile // n == line:
+                goals.append(tile % n)
+        return len(goals) - longest_increasing(goals)
+
+    def evaluate(self, config, n):
+        board = encode_config(config, n)
+        conflicts = 0
+        for line in range(n):
+            conflicts += self.line_conflicts(board, n, line, False)
+            conflicts += self.line_conflicts(board, n, line, True)
+        return manhattan.evaluate(config, n) + 2*conflicts
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        h = manhattan.update(h, board, n, tile, old_index, new_index)
+
+        # a vertical move changes two rows, a horizontal one two columns;
+        # the order within the other line of the tile stays the same
+        w = tile_bits(n)
+        parent = board - (tile << (new_index*w)) + (tile << (old_index*w))
+        vertical = old_index // n == new_index // n
+        if vertical:
+            lines = (old_index % n, new_index % n)
+        else:
+            lines = (old_index // n, new_index // n)
+        for line in lines:
+            h += 2*(self.line_conflicts(board, n, line, vertical) - self.line_conflicts(parent, n, line, vertical))
+        return h
+
+
+def composition_bits(n):
+    """bits per entry of a packed composition, see walking_distance_table"""
+    return n.bit_length()
+
+def pack_composition(counts, n):
+    """packs a composition (counts..., blank line) into an integer, entry i at bits [i*b, (i+1)*b)"""
+    b = composition_bits(n)
+    code = 0
+    for i, count in enumerate(counts):
+        code |= count << (i*b)
+    return code
+
+def walking_distance_table(n):
+    """
+    Breadth first search over row compositions: entry [r*n + g] counts the
+    tiles in row r whose goal row is g, plus the row of the blank. Moving a
+    tile vertically shifts one tile between the blank's row and a neighbour.
+    The same table serves columns, since the goal is symmetric about the
+    main diagonal. Built once per board size.
+
+    :return dict mapping the packed composition (see pack_composition) to the number of moves
+    """
+    try:
+        return _walking_distance_tables[n]
+    except KeyError:
+        pass
+
+    goal = [0]*(n*n)
+    for row in range(n):
+        goal[row*n + row] = n
+    goal[0] -= 1
+    goal = tuple(goal) + (0,)
+
+    table = {goal : 0}
+    frontier = deque([goal])
+    while frontier:
+        state = frontier.popleft()
+        blank = state[-1]
+        distance = table[state] + 1
+        for row in (blank - 1, blank + 1):
+            if row < 0 or row >= n:
+                continue
+            for group in range(n):
+                if state[row*n + group] == 0:
+                    continue
+                child = list(state)
+                child[row*n + group] -= 1
+                child[blank*n + group] += 1
+                child[-1] = row
+                child = tuple(child)
+                if child not in table:
+                    table[child] = distance
+                    frontier.append(child)
+
+    table = {pack_composition(state, n) : distance for state, distance in table.items()}
+    _walking_distance_tables[n] = table
+    return table
+
+
+class WalkingDistanceValue(int):
+    """heuristic value of WalkingDistanceHeuristic, remembers the packed row and column compositions"""
+    def __new__(cls, value, rows, columns):
+        h = int.__new__(cls, value)
+        h.rows, h.columns = rows, columns
+        return h
+
+    def __reduce__(self):
+        #int would pickle only the value, the compositions are needed to update it
+        return WalkingDistanceValue, (int(self), self.rows, self.columns)
+
+
+class WalkingDistanceHeuristic(object):
+    """
+        Walking distance: the moves needed to sort the tiles into their goal
+        rows, counted as if tiles of the same goal row were interchangeable,
+        plus the same for columns.
+    """
+    name = "walking-distance"
+
+    def counts(self, config, n, vertical):
+        """row (or column if vertical) composition of a board, see walking_distance_table"""
+        counts = [0]*(n*n + 1)
+        for idx, tile in enumerate(config):
+            if tile == 0:
+                counts[-1] = idx % n if vertical else idx // n
+            elif vertical:
+                counts[(idx % n)*n + tile % n] += 1
+            else:
+                counts[(idx // n)*n + tile // n] += 1
+        return counts
+
+    def evaluate(self, config, n):
+        table = walking_distance_table(n)
+        rows = pack_composition(self.counts(config, n, False), n)
+        columns = pack_composition(self.counts(config, n, True), n)
+        return WalkingDistanceValue(table[rows] + table[columns], rows, columns)
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        if not isinstance(h, WalkingDistanceValue):
+            #a value computed elsewhere, e.g. by another heuristic, has no compositions to update
+            return self.evaluate(decode_board(board, n), n)
+        table = walking_distance_table(n)
+        b = composition_bits(n)
+
+        # only the composition along the axis of the move changes: the tile crosses from
+        # old_line to new_line, and the blank the other way
+        horizontal = old_index // n == new_index // n
+        if horizontal:
+            old_line, new_line, group = old_index % n, new_index % n, tile % n
+            code = h.columns
+        else:
+            old_line, new_line, group = old_index // n, new_index // n, tile // n
+            code = h.rows
+        child = (code - (1 << ((old_line*n + group)*b)) + (1 << ((new_line*n + group)*b))
+                 + ((old_line - new_line) << (n*n*b)))
+        value = h + table[child] - table[code]
+        if horizontal:
+            return WalkingDistanceValue(value, h.rows, child)
+        return WalkingDistanceValue(value, child, h.columns)
+
+
+class MaxValue(int):
+    """heuristic value of MaxHeuristic, remembers the value of every component"""
+    def __new__(cls, parts):
+        value = int.__new__(cls, max(parts))
+        value.parts = parts
+        return value
+
+    def __reduce__(self):
+        #int would pickle only the maximum, the parts are needed to update it
+        return MaxValue, (self.parts,)
+
+
+class MaxHeuristic(object):
+    """
+        Maximum of several admissible heuristics, which is admissible too.
+        Every component is updated incrementally from its own previous value.
+    """
+    def __init__(self, components):
+        self.components = components
+        self.name = "max(" + ",".join(c.name for c in components) + ")"
+
+    def evaluate(self, config, n):
+        return MaxValue(tuple(c.evaluate(config, n) for c in self.components))
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        return MaxValue(tuple(c.update(part, board, n, tile, old_index, new_index)
+                              for c, part in zip(self.components, h.parts)))
+
+
+class CountingHeuristic(object):
+    """
+        Wraps a heuristic and counts the boards it scores from scratch and
+        the ones it updates from a parent, see puzzle.Search.counted.
+    """
+    def __init__(self, heuristic):
+        self.heuristic   = heuristic
+        self.name        = heuristic.name
+        self.evaluations = 0
+        self.updates     = 0
+
+    def evaluate(self, config, n):
+        self.evaluations += 1
+        return self.heuristic.evaluate(config, n)
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        self.updates += 1
+        return self.heuristic.update(h, board, n, tile, old_index, new_index)
+
+
+def _pattern_database(n, directory=pattern_db.DEFAULT_DIRECTORY, partition=None, **options):
+    return pattern_db.PatternDatabaseHeuristic(n, partition, directory)
+
+# name -> factory(n, **options)
+HEURISTICS = {
+    "manhattan"        : lambda n, **options: manhattan,
+    "linear-conflict"  : lambda n, **options: LinearConflictHeuristic(),
+    "walking-distance" : lambda n, **options: WalkingDistanceHeuristic(),
+    "pdb"              : _pattern_database,
+}
+
+def register(name, factory):
+    """
+    Makes a heuristic available by name.
+    :param name->string
+    :param factory : callable taking the board size and options, returning a heuristic
+    """
+    HEURISTICS[name] = factory
+
+def split_arguments(text):
+    """splits 'a,max(b,c)' on the top level commas"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts]
+
+def get_heuristic(spec, n, **options):
+    """
+    Builds the heuristic described by spec for n*n boards.
+    :param spec->string : registered name, or max(spec,spec,...)
+    :param n->int : Size of the board
+    :param options : passed to the factories, e.g. directory and partition for pdb
+    """
+    spec = spec.strip().lower()
+    if spec.startswith("max(") and spec.endswith(")"):
+        components = [get_heuristic(part, n, **options) for part in split_arguments(spec[4:-1])]
+        if len(components) == 1:
+            return components[0]
+        return MaxHeuristic(components)
+    if spec not in HEURISTICS:
+        raise Exception("Unknown heuristic, choose from %s or max(...) : " % ", ".join(sorted(HEURISTICS)), spec)
+    return HEURISTICS[spec](n, **options)
+
+def main():
+    board = list(map(int, sys.argv[1].split(",")))
+    n = int(math.sqrt(len(board)))
+    for name in sorted(HEURISTICS):
+        try:
+            print("%-18s %d" % (name, get_heuristic(name, n).evaluate(board, n)))
+        except Exception as e:
+            print("%-18s unavailable: %s" % (name, e.args[0]))
+
+if __name__ == '__main__':
+    main()
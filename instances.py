@@ -0,0 +1,158 @@
+"""
+Seeded generator of solvable boards.
+
+random_board() draws uniformly among the solvable boards. generate() draws
+a board whose optimal solution length is a given depth, or lies in a band
+of depths:
+
+  - up to 3x3, every board is sorted by its distance from the goal with a
+    breadth first search (181,440 boards for 3x3, done once per process),
+    and a board is drawn from the layer of a depth chosen uniformly in the
+    band,
+  - larger boards are the end of a random walk from the goal, solved
+    optimally with IDA* to measure the depth. The walk is made longer or
+    shorter until the depth falls in the band, so deep bands on 4x4 boards
+    want a strong heuristic, e.g. pdb.
+
+The same seed always gives the same boards:
+
+    python instances.py --size 3 --depth 20 --count 5 --seed 1
+    python instances.py --size 4 --band 30,40 --heuristic pdb --count 10 > boards.txt
+"""
+from __future__ import print_function
+
+import sys
+import random
+import argparse
+
+from PuzzleState import PuzzleState, tile_bits, goal_board, decode_board, neighbour_table
+import heuristics
+import ranking
+import puzzle
+
+#largest boards whose distance layers are enumerated
+MAX_LAYERED_SIZE = 3
+
+#random walks tried before giving up
+MAX_TRIES = 200
+
+_layers = {}
+
+def random_board(n, rng=random):
+    """
+    Uniformly drawn solvable board: a random permutation, with two tiles
+    swapped when its parity is the wrong one.
+    """
+    config = list(range(n*n))
+    rng.shuffle(config)
+    if not ranking.is_reachable(config, n):
+        first, second = [i for i, tile in enumerate(config) if tile != 0][:2]
+        config[first], config[second] = config[second], config[first]
+    return config
+
+def depth_layers(n):
+    """
+    Breadth first search from the goal.
+    :return List, entry [d] lists the packed boards at optimal distance d
+    """
+    if n in _layers:
+        return _layers[n]
+    if n > MAX_LAYERED_SIZE:
+        raise Exception("Distance layers are only enumerated up to %dx%d boards : " % (MAX_LAYERED_SIZE, MAX_LAYERED_SIZE), n)
+
+    w = tile_bits(n)
+    mask = (1 << w) - 1
+    moves = neighbour_table(n)
+    goal = goal_board(n)
+    layers = [[(goal, 0)]]
+    previous, current = set(), {goal}
+    while layers[-1]:
+        layer = []
+        seen = set()
+        for board, blank in layers[-1]:
+            for target, _ in moves[blank]:
+                tile = (board >> (target*w)) & mask
+                child = board - (tile << (target*w)) + (tile << (blank*w))
+                #the graph is bipartite, a child is either new or in the layer before
+                if child in previous or child in seen:
+                    continue
+                seen.add(child)
+                layer.append((child, target))
+        previous, current = current, seen
+        layers.append(layer)
+    _layers[n] = [[board for board, _ in layer] for layer in layers[:-1]]
+    return _layers[n]
+
+def optimal_depth(config, n, heuristic):
+    """length of an optimal solution found by IDA*"""
+    return puzzle.solve(config, "ida", heuristic).search_depth
+
+def walk(n, length, rng):
+    """end of a random walk of length moves from the goal that never undoes its last move"""
+    state = PuzzleState(list(range(n*n)), n)
+    for _ in range(length):
+        state = rng.choice(state.successors(prune=True))
+        state.parent = None
+    return state.config
+
+def generate(n, depth=None, band=None, seed=None, heuristic="linear-conflict", rng=None):
+    """
+    :param n->int : Size of the board
+    :param depth->int : optimal solution length wanted
+    :param band->tuple : (lowest, highest) optimal solution length, instead of depth
+    :param seed : seed of a new random.Random, unless rng is given
+    :param heuristic : heuristic of the IDA* measuring boards larger than MAX_LAYERED_SIZE
+    :param rng->random.Random : source of randomness, to draw a sequence of boards
+    :return board configuration
+    """
+    low, high = (depth, depth) if depth is not None else band
+    if low < 0 or high < low:
+        raise Exception("Not a band of depths : ", (low, high))
+    rng = rng or random.Random(seed)
+
+    if n <= MAX_LAYERED_SIZE:
+        layers = depth_layers(n)
+        depths = [d for d in range(low, min(high, len(layers) - 1) + 1) if layers[d]]
+        if not depths:
+            raise Exception("No %dx%d board has an optimal solution of this length : " % (n, n), (low, high))
+        return decode_board(rng.choice(layers[rng.choice(depths)]), n)
+
+    if isinstance(heuristic, str):
+        heuristic = heuristics.get_heuristic(heuristic, n)
+    #a random walk ends closer to the goal than its length, so it starts at the deep end of the band
+    length = high
+    for _ in range(MAX_TRIES):
+        config = walk(n, length, rng)
+        found = optimal_depth(config, n, heuristic)
+        if low <= found <= high:
+            return config
+        #the depth has the parity of the walk's length
+        length = max(1, length + (low - found if found < low else high - found))
+    raise Exception("No board found in the band of depths after %d random walks : " % MAX_TRIES, (low, high))
+
+def parse_band(text):
+    """'20,30' -> (20, 30)"""
+    low, high = map(int, text.split(","))
+    return low, high
+
+def main():
+    parser = argparse.ArgumentParser(description="Print solvable boards, one per line")
+    parser.add_argument("--size", type=int, default=3, help="board size n of the n*n puzzle")
+    parser.add_argument("--depth", type=int, help="optimal solution length of every board")
+    parser.add_argument("--band", type=parse_band, help="lowest,highest optimal solution length")
+    parser.add_argument("--count", type=int, default=1, help="number of boards")
+    parser.add_argument("--seed", type=int, help="seed of the generator, boards are repeatable with it")
+    parser.add_argument("--heuristic", default="linear-conflict", help="heuristic measuring boards above 3x3")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for _ in range(args.count):
+        if args.depth is None and args.band is None:
+            config = random_board(args.size, rng)
+        else:
+            config = generate(args.size, args.depth, args.band, heuristic=args.heuristic, rng=rng)
+        print(",".join(map(str, config)))
+        sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+Disjoint additive pattern databases for the N-puzzle.
+
+The tiles are split into disjoint groups. For every group a table stores,
+for every placement of the group's tiles, the minimum number of moves of
+those tiles needed to bring them home. Moves of other tiles are free, so
+the values of the groups can be added and the sum is still admissible.
+
+Tables are built once with a retrograde breadth first search from the goal
+and stored in binary files that are memory-mapped when solving:
+
+    python pattern_db.py build --size 4
+    python pattern_db.py check --size 4
+"""
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import mmap
+import time
+import random
+import struct
+import argparse
+from array import array
+
+from PuzzleState import manhattan_table, decode_board
+from ranking import partial_count, rank_partial
+
+# Header: magic, format version, board size, number of tiles in the group
+HEADER = struct.Struct("<4sBBB")
+MAGIC = b"NPDB"
+VERSION = 1
+
+UNREACHED = 255
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdb")
+
+DEFAULT_PARTITIONS = {
+    3 : [[1, 2, 3, 4], [5, 6, 7, 8]],
+    4 : [[1, 4, 5, 8, 9, 12], [2, 3, 6, 7, 10, 11], [13, 14, 15]],
+}
+
+def table_path(n, tiles, directory=DEFAULT_DIRECTORY):
+    """file holding the table of one group"""
+    return os.path.join(directory, "pdb-%dx%d-%s.bin" % (n, n, "_".join(map(str, tiles))))
+
+def parse_partition(text):
+    """parses '1,2,3/4,5,6' into [[1,2,3],[4,5,6]]"""
+    return [list(map(int, group.split(","))) for group in text.split("/")]
+
+def check_partition(n, partition):
+    """raises if partition is not a set of disjoint groups of tiles 1..n*n-1"""
+    tiles = [tile for group in partition for tile in group]
+    if len(tiles) != len(set(tiles)) or not set(tiles) <= set(range(1, n*n)):
+        raise Exception("Partition groups must be disjoint sets of tiles 1..%d : " % (n*n - 1), partition)
+    for group in partition:
+        if len(group) > n*n - 2:
+            raise Exception("Group is too large for the board : ", group)
+
+def build_pattern_table(n, tiles):
+    """
+    Retrograde breadth first search over abstract states: the positions of
+    the group's tiles plus the region the blank can reach without moving
+    one of them. Only moves of the group's tiles are counted.
+
+    :param n->int : Size of the board
+    :param tiles->List : tiles of the group
+    :return bytearray indexed by rank_partial
+    """
+    cells = n*n
+    k = len(tiles)
+    full = (1 << cells) - 1
+    bits = (cells - 1).bit_length()
+    pos_mask = (1 << bits) - 1
+    group_mask = (1 << (k*bits)) - 1
+
+    first_col = sum(1 << (row*n) for row in range(n))
+    last_col = first_col << (n - 1)
+
+    neighbours = []
+    for idx in range(cells):
+        row, col = idx//n, idx%n
+        neighbours.append([p for p, ok in ((idx - n, row > 0), (idx + n, row < n - 1),
+                                           (idx - 1, col > 0), (idx + 1, col < n - 1)) if ok])
+
+    def blank_region(start, free):
+        region = 1 << start
+        while True:
+            grown = (region | ((region << 1) & ~first_col) | ((region >> 1) & ~last_col)
+                     | (region << n) | (region >> n)) & free
+            if grown == region:
+                return region
+            region = grown
+
+    def lowest_cell(region):
+        return (region & -region).bit_length() - 1
+
+    # every abstract state is visited once per blank region, regions are
+    # identified by their lowest cell
+    typecode = "H" if cells <= 16 else "I" if cells <= 32 else "Q"
+    size = partial_count(cells, k)
+    visited = array(typecode, bytes(size*array(typecode).itemsize))
+    table = bytearray([UNREACHED])*size
+
+    # states of a layer are packed as positions followed by one blank cell
+    goal_positions = tuple(tiles)
+    goal_rank = rank_partial(goal_positions, cells)
+    goal_blank = lowest_cell(blank_region(0, full & ~sum(1 << p for p in goal_positions)))
+    visited[goal_rank] |= 1 << goal_blank
+    table[goal_rank] = 0
+    layer = [sum(p << (i*bits) for i, p in enumerate(goal_positions)) | goal_blank << (k*bits)]
+
+    depth = 0
+    while layer:
+        depth += 1
+        next_layer = []
+        for packed in layer:
+            positions = [(packed >> (i*bits)) & pos_mask for i in range(k)]
+            occupied = sum(1 << p for p in positions)
+            region = blank_region(packed >> (k*bits), full & ~occupied)
+
+            for i, pos in enumerate(positions):
+                for target in neighbours[pos]:
+                    if not (region >> target) & 1:
+                        continue
+                    positions[i] = target
+                    new_occupied = occupied ^ (1 << pos) ^ (1 << target)
+                    new_blank = lowest_cell(blank_region(pos, full & ~new_occupied))
+                    rank = rank_partial(positions, cells)
+                    if not (visited[rank] >> new_blank) & 1:
+                        visited[rank] |= 1 << new_blank
+                        if table[rank] == UNREACHED:
+                            table[rank] = depth
+                        moved = (packed & group_mask) - (pos << (i*bits)) + (target << (i*bits))
+                        next_layer.append(moved | new_blank << (k*bits))
+                    positions[i] = pos
+        layer = next_layer
+    return table
+
+def write_pattern_table(path, n, tiles, table):
+    """writes a table built by build_pattern_table to path"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n, len(tiles)))
+        f.write(bytearray(tiles))
+        f.write(table)
+
+
+class PatternTable(object):
+    """
+        Read only view of one group's table, memory-mapped from disk so the
+        pages are loaded lazily and shared between processes.
+    """
+    def __init__(self, path, n=None, tiles=None):
+        """
+        :param path->string : table file
+        :param n->int : expected board size
+        :param tiles->List : expected tiles of the group
+        """
+        if not os.path.exists(path):
+            raise Exception("Pattern database not found, build it with 'python pattern_db.py build' : ", path)
+
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.n, k = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("Not a pattern database file : ", path)
+
+        self.tiles  = list(self.mm[HEADER.size:HEADER.size + k])
+        self.offset = HEADER.size + k
+        self.size   = partial_count(self.n*self.n, k)
+        self.path   = path
+
+        if len(self.mm) != self.offset + self.size:
+            raise Exception("Pattern database file is truncated : ", path)
+        if (n is not None and n != self.n) or (tiles is not None and list(tiles) != self.tiles):
+            raise Exception("Pattern database does not match the requested group : ", path)
+
+    def lookup(self, positions):
+        """value for the given positions of the group's tiles"""
+        return self.mm[self.offset + rank_partial(positions, self.n*self.n)]
+
+    def values(self):
+        """the whole table as bytes"""
+        return self.mm[self.offset:]
+
+    def close(self):
+        self.mm.close()
+
+
+class PatternDatabaseValue(int):
+    """heuristic value of PatternDatabaseHeuristic, remembers the positions and the value of every group"""
+    def __new__(cls, value, positions, values):
+        h = int.__new__(cls, value)
+        h.positions, h.values = positions, values
+        return h
+
+    def __reduce__(self):
+        #int would pickle only the value, the groups are needed to update it
+        return PatternDatabaseValue, (int(self), self.positions, self.values)
+
+
+class PatternDatabaseHeuristic(object):
+    """
+        Additive pattern database heuristic, usable wherever ManhattanHeuristic is.
+    """
+    name = "pdb"
+
+    def __init__(self, n, partition=None, directory=DEFAULT_DIRECTORY):
+        """
+        :param n->int : Size of the board
+        :param partition->List : disjoint groups of tiles, defaults to DEFAULT_PARTITIONS[n]
+        :param directory->string : folder holding the table files
+        """
+        if partition is None:
+            if n not in DEFAULT_PARTITIONS:
+                raise Exception("No default pattern database partition for board size : ", n)
+            partition = DEFAULT_PARTITIONS[n]
+        check_partition(n, partition)
+
+        self.n      = n
+        self.tables = [PatternTable(table_path(n, group, directory), n, group) for group in partition]
+
+        # group of every tile, tiles outside the partition count with manhattan distance,
+        # and the place of every tile within its group
+        self.group_of = [None]*(n*n)
+        self.slot_of  = [None]*(n*n)
+        for i, group in enumerate(partition):
+            for slot, tile in enumerate(group):
+                self.group_of[tile] = i
+                self.slot_of[tile]  = slot
+        self.loose = [tile for tile in range(1, n*n) if self.group_of[tile] is None]
+
+    def positions(self, config):
+        """index of every tile"""
+        positions = [0]*len(config)
+        for idx, tile in enumerate(config):
+            positions[tile] = idx
+        return positions
+
+    def evaluate(self, config, n):
+        where = self.positions(config)
+        table = manhattan_table(n)
+        h = sum(table[where[tile]][tile] for tile in self.loose)
+        positions = tuple(tuple(where[tile] for tile in group.tiles) for group in self.tables)
+        values = tuple(group.lookup(p) for group, p in zip(self.tables, positions))
+        return PatternDatabaseValue(h + sum(values), positions, values)
+
+    def update(self, h, board, n, tile, old_index, new_index):
+        i = self.group_of[tile]
+        if i is None:
+            table = manhattan_table(n)
+            value = h - table[old_index][tile] + table[new_index][tile]
+            if not isinstance(h, PatternDatabaseValue):
+                return value
+            return PatternDatabaseValue(value, h.positions, h.values)
+        if not isinstance(h, PatternDatabaseValue):
+            #a value computed elsewhere, e.g. by another heuristic, has no groups to update
+            return self.evaluate(decode_board(board, n), n)
+
+        # only the group of the moved tile changes its value
+        slot = self.slot_of[tile]
+        moved = h.positions[i][:slot] + (new_index,) + h.positions[i][slot + 1:]
+        moved_value = self.tables[i].lookup(moved)
+        positions = h.positions[:i] + (moved,) + h.positions[i + 1:]
+        values = h.values[:i] + (moved_value,) + h.values[i + 1:]
+        return PatternDatabaseValue(h - h.values[i] + moved_value, positions, values)
+
+def build(n, partition, directory):
+    for group in partition:
+        path = table_path(n, group, directory)
+        start_time = time.time()
+        table = build_pattern_table(n, group)
+        write_pattern_table(path, n, group, table)
+        print("%s : %d entries, max %d, built in %.3f second(s)" % (path, len(table), max(table), time.time() - start_time))
+
+def check(n, partition, directory, samples):
+    """
+    Verifies every table: header, size, full coverage, zero at the goal,
+    and that each group dominates the manhattan distance of its tiles on
+    random placements.
+    """
+    ok = True
+    manhattan = manhattan_table(n)
+    for group in partition:
+        path = table_path(n, group, directory)
+        try:
+            table = PatternTable(path, n, group)
+        except Exception as e:
+            print("FAIL", *e.args)
+            ok = False
+            continue
+
+        values = table.values()
+        problems = []
+        if UNREACHED in values:
+            problems.append("%d unreached entries" % values.count(UNREACHED))
+        if table.lookup(group) != 0:
+            problems.append("goal value is %d" % table.lookup(group))
+        for _ in range(samples):
+            positions = random.sample(range(n*n), len(group))
+            if table.lookup(positions) < sum(manhattan[p][t] for p, t in zip(positions, group)):
+                problems.append("value below manhattan distance at %s" % positions)
+                break
+
+        if problems:
+            ok = False
+            print("FAIL", path, ":", ", ".join(problems))
+        else:
+            print("OK", path, ": %d entries, max %d, mean %.3f" % (len(values), max(values), sum(values)/len(values)))
+        table.close()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check additive pattern databases")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--size", type=int, default=4, help="board size n of the n*n puzzle")
+    parser.add_argument("--partition", help="groups of tiles, e.g. 1,2,3,4/5,6,7,8")
+    parser.add_argument("--dir", default=DEFAULT_DIRECTORY, help="folder of the table files")
+    parser.add_argument("--samples", type=int, default=10000, help="random placements tested by check")
+    args = parser.parse_args()
+
+    if args.partition:
+        partition = parse_partition(args.partition)
+    elif args.size in DEFAULT_PARTITIONS:
+        partition = DEFAULT_PARTITIONS[args.size]
+    else:
+        parser.error("no default partition for size %d, use --partition" % args.size)
+    check_partition(args.size, partition)
+
+    if args.command == "build":
+        build(args.size, partition, args.dir)
+    elif not check(args.size, partition, args.dir, args.samples):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
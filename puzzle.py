@@ -1,215 +1,1002 @@
 
 from __future__ import division
 from __future__ import print_function
-from PuzzleState import PuzzleState
+from PuzzleState import PuzzleState, goal_board
+import heuristics
+import pattern_db
+import arena
+import constructive
+import external_bfs
+import frontier as frontiers
+import hda
+import ranking
+import solution_table
+import solution_cache
+import telemetry as telemetry_hooks
+import vector_bfs
 
+import os
 import sys
 import math
 import time
-import queue as Q
+import shutil
+import tempfile
+import heapq
+import argparse
 
-import psutil
 
-path_to_goal = []
-cost_of_path = 0
-nodes_expanded =0
-search_depth = 0
-max_search_depth = 0
-running_time = 0
-max_ram_usage = 0
+class SearchBudgetExceeded(Exception):
+    """raised by the search functions once the node or time budget is used up"""
+    pass
 
-goal_state = None
+class SearchCancelled(SearchBudgetExceeded):
+    """raised by the search functions once Search.cancel() was called"""
+    pass
 
-def write_output(path_to_goal, nodes_expanded, search_depth, max_search_depth, t):
+#first heuristic weight of the ara mode, and how much it is lowered after every solution
+ARA_WEIGHT = 3.0
+ARA_STEP   = 0.5
+
+class Search(object):
+    """
+        Statistics and limits of a single search. Every search gets its own
+        instance, so searches can run repeatedly and from several threads.
+    """
+    def __init__(self, max_nodes=None, max_seconds=None, closed_set="hash", priority_queue="heap", workers=None,
+                 telemetry=None, weight=None, shorten=False, layers_directory=None):
+        """
+        :param max_nodes->int : maximum number of nodes expanded, None for unlimited
+        :param max_seconds->float : maximum running time, None for unlimited
+        :param closed_set->string : backend of the explored/frontier sets, see ranking.board_set
+        :param priority_queue->string : frontier of A*, one of frontier.PRIORITY_QUEUES
+        :param workers->int : processes of the parallel search modes, None for one per core
+        :param telemetry->telemetry.Telemetry : takes periodic snapshots of the search
+        :param weight->float : first heuristic weight of the ara mode, None for ARA_WEIGHT
+        :param shorten->bool : let the macro mode shorten its solution, see constructive.shorten
+        :param layers_directory->string : folder where the ebfs mode keeps its layers and checkpoint, None for a temporary one
+        """
+        self.start_time       = time.time()
+        self.start_rss        = telemetry_hooks.rss()
+        self.nodes_expanded   = 0
+        self.nodes_generated  = 0
+        self.max_search_depth = 0
+
+        #counting wrappers of the heuristics the search scores boards with, see counted()
+        self.heuristics = []
+
+        self.node_budget = max_nodes
+        self.deadline    = self.start_time + max_seconds if max_seconds is not None else None
+        self.closed_set  = closed_set
+        self.priority_queue = priority_queue
+        self.workers        = workers
+        self.weight         = weight
+        self.shorten        = shorten
+        self.layers_directory = layers_directory
+        self.cancelled      = False
+
+        # callables returning the number of nodes on the frontier and in the closed set, and the
+        # current f-bound or depth, set by the engines that have them
+        self.frontier_size  = None
+        self.closed_size    = None
+        self.bound          = None
+
+        self.telemetry = telemetry
+        if telemetry is not None:
+            telemetry.start(self)
+
+    def board_set(self, n):
+        """new empty set of packed boards with the chosen backend"""
+        return ranking.board_set(n, self.closed_set)
+
+    def frontier(self, order):
+        """
+        New empty frontier.
+        :param order->string : 'fifo', 'lifo' or 'priority' for the chosen priority queue
+        """
+        return frontiers.make_frontier(self.priority_queue if order == "priority" else order)
+
+    def expanded(self, children):
+        """
+        Counts the expansion of a node, raises SearchBudgetExceeded when a limit is reached.
+        :param children->List : the children generated
+        """
+        self.nodes_expanded  += 1
+        self.nodes_generated += len(children)
+        self.check_budget()
+
+    def counted(self, heuristic):
+        """heuristic wrapped to report its full evaluations and incremental updates in the result"""
+        heuristic = heuristics.CountingHeuristic(heuristic)
+        self.heuristics.append(heuristic)
+        return heuristic
+
+    def cancel(self):
+        """asks the search to stop at its next expansion, safe to call from another thread"""
+        self.cancelled = True
+
+    def progress(self):
+        """(nodes expanded, frontier size or None, seconds elapsed), readable from another thread"""
+        frontier_size = self.frontier_size() if self.frontier_size is not None else None
+        return self.nodes_expanded, frontier_size, time.time() - self.start_time
+
+    def check_budget(self):
+        """raises SearchBudgetExceeded when the node or time limit is reached"""
+        if self.cancelled:
+            raise SearchCancelled("cancelled")
+        if self.telemetry is not None and self.nodes_expanded >= self.telemetry.next_check:
+            self.telemetry.tick(self)
+        if self.node_budget is not None and self.nodes_expanded > self.node_budget:
+            raise SearchBudgetExceeded("node budget of %d exceeded" % self.node_budget)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise SearchBudgetExceeded("time budget exceeded")
+
+    def result(self, path_to_goal, search_depth, extra=None):
+        """the SolveResult of a search that found path_to_goal"""
+        fields = {}
+        if self.heuristics:
+            fields['full_evaluations']    = sum(heuristic.evaluations for heuristic in self.heuristics)
+            fields['incremental_updates'] = sum(heuristic.updates for heuristic in self.heuristics)
+        fields['ram_delta_kb'] = telemetry_hooks.rss() - self.start_rss
+        fields.update(extra or {})
+        if self.telemetry is not None:
+            fields.update(self.telemetry.finish(self))
+        return SolveResult("solved", path_to_goal, self.nodes_expanded, search_depth, self.max_search_depth,
+                           time.time() - self.start_time, fields)
+
+    def failure(self, status, reason=None):
+        """the SolveResult of a search that ended without a solution"""
+        fields = {'ram_delta_kb' : telemetry_hooks.rss() - self.start_rss}
+        if self.telemetry is not None:
+            fields.update(self.telemetry.finish(self))
+        result = SolveResult(status, None, self.nodes_expanded, 0, self.max_search_depth, time.time() - self.start_time, fields)
+        result.reason = reason
+        return result
+
+class SolveResult(object):
+    """
+        Outcome of a search. status is 'solved', 'unsolvable', 'budget_exceeded'
+        or 'cancelled', the other fields are those of output.txt.
+    """
+    def __init__(self, status, path_to_goal, nodes_expanded, search_depth, max_search_depth, running_time, extra=None):
+        """
+        :param status->string
+        :param path_to_goal->List : solution of the puzzle, None unless solved
+        :param nodes_expanded->int : number of nodes expanded
+        :param search_depth->int : search depth of the solution
+        :param max_search_depth->int : search depth reached
+        :param running_time->float : seconds spent searching. max_ram_usage is the peak RSS of the process
+                                     since it started in KB, the extra field ram_delta_kb the change of RSS
+                                     over this search
+        :param extra->dict : additional fields of the search mode
+        """
+        self.status           = status
+        self.path_to_goal     = path_to_goal
+        self.nodes_expanded   = nodes_expanded
+        self.search_depth     = search_depth
+        self.max_search_depth = max_search_depth
+        self.running_time     = running_time
+        self.max_ram_usage    = telemetry_hooks.peak_rss()
+        self.extra            = extra or {}
+        self.reason           = None
+
+    @property
+    def cost_of_path(self):
+        return len(self.path_to_goal) if self.path_to_goal is not None else None
+
+    def fields(self):
+        """the fields of output.txt in order, followed by the extra ones"""
+        fields = {
+            'path_to_goal'     : self.path_to_goal,
+            'cost_of_path'     : self.cost_of_path,
+            'nodes_expanded'   : self.nodes_expanded,
+            'search_depth'     : self.search_depth,
+            'max_search_depth' : self.max_search_depth,
+            'running_time'     : self.running_time,
+            'max_ram_usage'    : self.max_ram_usage,
+        }
+        fields.update(self.extra)
+        return fields
+
+def write_output(result, path="output.txt"):
     '''
-    Writes output to output.txt 
+    Writes a solved result to output.txt
 
-    :param config->path_to_goal : solution of the puzzle, list of strings, e.g. ['Up','Down','Left']
-    :param node_expanded->int : number of nodes expanded before finding a solution
-    :param search_depth->int : search depth of the solution
-    :param max_search_depth->string : search depth reached before finding the solution
-    :param t->float : runtime
+    :param result->SolveResult : outcome of a search
+    :param path->string : file to write
     '''
     
-    f = open("output.txt", "w+")
+    f = open(path, "w+")
     
-    f.write("path_to_goal: " + str(path_to_goal))
-    f.write("\ncost_of_path: " + str(len(path_to_goal)))
-    f.write("\nnodes_expanded: " + str(nodes_expanded))
-    f.write("\nsearch_depth: " + str(search_depth))
-    f.write("\nmax_search_depth: " + str(max_search_depth))
-    f.write("\nrunning_time: " + format(t, '.8f'))
-    f.write("\nmax_ram_usage: " + format(psutil.Process().memory_info().rss/1000, '.8f'))
+    f.write("path_to_goal: " + str(result.path_to_goal))
+    f.write("\ncost_of_path: " + str(result.cost_of_path))
+    f.write("\nnodes_expanded: " + str(result.nodes_expanded))
+    f.write("\nsearch_depth: " + str(result.search_depth))
+    f.write("\nmax_search_depth: " + str(result.max_search_depth))
+    f.write("\nrunning_time: " + format(result.running_time, '.8f'))
+    f.write("\nmax_ram_usage: " + format(result.max_ram_usage, '.8f'))
+    for key, value in result.extra.items():
+        f.write("\n" + key + ": " + str(value))
     
     f.close()
 
 
 
-def bfs_search(initial_state):
+def bfs_search(initial_state, search=None):
     """BFS search"""
     
-    start_time  = time.time()
-    
-    global path_to_goal, cost_of_path, nodes_expanded, search_depth, max_search_depth, running_time, max_ram_usage
-     
-    #Initialize Priority Queue:
-    frontier = Q.Queue()
-    frontier.put(initial_state)
-     
-    #set of frontier config for testing purposes
-    frontier_set = set()
-    frontier_set.add(tuple(initial_state.config))
-     
-    #Initialize explored set:
-    explored = set()
-    
-    while not frontier.empty():
+    search = search or Search()
+
+    #search tree, nodes are added in the order they are reached
+    tree = arena.NodeArena(initial_state.n)
+    tree.add(initial_state.board, initial_state.blank)
+
+    #set of boards in the tree, explored or on the frontier
+    seen = search.board_set(initial_state.n)
+    seen.add(initial_state.board)
+
+    goal = goal_board(initial_state.n)
+
+    #the arena doubles as the FIFO frontier, nodes from head on are not expanded yet
+    head = 0
+    search.frontier_size = lambda: len(tree) - head
+    search.closed_size   = lambda: head
+    search.bound         = lambda: tree.costs[max(head - 1, 0)]
+    while head < len(tree):
         
-        state =  frontier.get()
-        explored.add(tuple(state.config))
+        node = head
+        head += 1
         
-        if test_goal(state):
-            search_depth = state.cost
-            while(state!=None):
-                path_to_goal.append(state.action)
-                state=state.parent
-            path_to_goal = path_to_goal[::-1]
-            path_to_goal = list(path_to_goal[1:])
-            end_time = time.time()
-            t = end_time - start_time
-            write_output(path_to_goal, nodes_expanded, search_depth, max_search_depth,t)
-            return state
+        if tree.boards[node] == goal:
+            return search.result(tree.path(node), tree.costs[node])
         
-        children = state.expand()
-        nodes_expanded +=1
-        for child in children:
-            if (tuple(child.config) not in explored ) and (tuple(child.config) not in frontier_set):
-                frontier_set.add(tuple(child.config))
-                frontier.put(child)
-                if child.cost > max_search_depth:
-                    max_search_depth = child.cost
+        children = tree.children(node)
+        search.expanded(children)
+        for board, blank, move in children:
+            if board not in seen:
+                seen.add(board)
+                child = tree.add(board, blank, node, move)
+                if tree.costs[child] > search.max_search_depth:
+                    search.max_search_depth = tree.costs[child]
     return None
 
-def dfs_search(initial_state):
+def external_bfs_search(initial_state, search=None):
+    """
+    BFS search keeping its layers on disk, see external_bfs.py. Without
+    Search.layers_directory the layers are written to a temporary folder
+    (set TMPDIR to choose the disk) that is removed afterwards. With it they
+    are kept there with a checkpoint after every layer, and a search of the
+    same board stopped by a budget or an interruption resumes from it.
+    """
+    search = search or Search()
+
+    n = initial_state.n
+    goal = goal_board(n)
+    directory = search.layers_directory or tempfile.mkdtemp(prefix="ebfs-")
+    try:
+        bfs = external_bfs.ExternalBFS(n, os.path.join(directory, "layers"))
+        if search.layers_directory is not None and bfs.resumable(initial_state.board):
+            bfs.resume()
+            search.nodes_expanded   = sum(bfs.counts[:-1])
+            search.nodes_generated  = sum(bfs.generated)
+            search.max_search_depth = len(bfs.counts) - 1
+        else:
+            bfs.start(initial_state.config)
+        search.frontier_size = lambda: bfs.counts[-1]
+        search.closed_size   = lambda: sum(bfs.counts[:-1])
+        search.bound         = lambda: len(bfs.counts) - 1
+
+        found = external_bfs.file_contains(bfs.layer_path(len(bfs.counts) - 1), bfs.width, goal)
+        while not found and not bfs.finished():
+            found = bfs.expand(goal)
+            search.nodes_expanded  += bfs.counts[-2]
+            search.nodes_generated += bfs.generated[-1]
+            if bfs.counts[-1]:
+                search.max_search_depth = len(bfs.counts) - 1
+            search.check_budget()
+
+        if not found:
+            return None
+        search_depth = len(bfs.counts) - 1
+        return search.result(bfs.path_to(goal, search_depth), search_depth,
+                             {'layer_sizes' : bfs.counts, 'layer_seconds' : [round(seconds, 6) for seconds in bfs.seconds]})
+    finally:
+        if search.layers_directory is None:
+            shutil.rmtree(directory)
+
+def dfs_search(initial_state, search=None):
     """DFS search"""
-    start_time  = time.time()
-    
-    global path_to_goal, cost_of_path, nodes_expanded, search_depth, max_search_depth, running_time, max_ram_usage
+    search = search or Search()
+
+    #search tree, the frontier holds indices of its nodes
+    tree = arena.NodeArena(initial_state.n)
      
-    #Initialize Priority Queue:
-    frontier = Q.LifoQueue()
-    frontier.put(initial_state)
+    #Initialize the frontier:
+    frontier = search.frontier("lifo")
+    frontier.push(tree.add(initial_state.board, initial_state.blank))
+    search.frontier_size = frontier.__len__
     
-    #set of frontier config for testing purposes
-    frontier_set = set()
-    frontier_set.add(tuple(initial_state.config))
-     
-    #Initialize explored set:
-    explored = set()
+    #set of boards in the tree, explored or on the frontier
+    seen = search.board_set(initial_state.n)
+    seen.add(initial_state.board)
+
+    goal = goal_board(initial_state.n)
+
+    node = 0
+    search.closed_size = lambda: len(seen) - len(frontier)
+    search.bound       = lambda: tree.costs[node]
     
-    while not frontier.empty():
+    while frontier:
         
-        state =  frontier.get()
-        explored.add(tuple(state.config))
+        node = frontier.pop()
         
-        if test_goal(state):
-            search_depth = state.cost
-            while(state!=None):
-                path_to_goal.append(state.action)
-                state=state.parent
-                
-            #prepare stats for writeoutput
-            path_to_goal = path_to_goal[::-1]
-            path_to_goal = list(path_to_goal[1:])
-            end_time = time.time()
-            t = end_time - start_time
-            
-            write_output(path_to_goal, nodes_expanded, search_depth, max_search_depth,t)
-            return state
+        if tree.boards[node] == goal:
+            return search.result(tree.path(node), tree.costs[node])
         
-        children = state.expand()
+        children = tree.children(node)
         children.reverse()
-        nodes_expanded +=1
-        for child in children:
-            if (tuple(child.config) not in explored ) and (tuple(child.config) not in frontier_set):
-                frontier_set.add(tuple(child.config))
-                frontier.put(child)
-                if child.cost > max_search_depth:
-                    max_search_depth = child.cost
+        search.expanded(children)
+        for board, blank, move in children:
+            if board not in seen:
+                seen.add(board)
+                child = tree.add(board, blank, node, move)
+                frontier.push(child)
+                if tree.costs[child] > search.max_search_depth:
+                    search.max_search_depth = tree.costs[child]
     return None
 
-def A_star_search(initial_state):
+def vector_bfs_search(initial_state, search=None):
+    """
+    BFS search expanding a whole layer at a time with NumPy, see vector_bfs.py.
+    The statistics are those bfs_search reports for the same board, the
+    budgets are checked once per layer.
+    """
+    search = search or Search()
+
+    n = initial_state.n
+    goal = goal_board(n)
+    layers = [vector_bfs.root_layer(initial_state)]
+    previous = None
+    search.frontier_size = lambda: len(layers[-1])
+    search.closed_size   = lambda: sum(len(layer) for layer in layers[:-1])
+    search.bound         = lambda: len(layers) - 1
+
+    while len(layers[-1]):
+        layer = layers[-1]
+        depth = len(layers) - 1
+
+        found = (layer.boards == goal).nonzero()[0]
+        if len(found):
+            #bfs_search expands the boards before the goal in its layer, reaching the next depth
+            index = int(found[0])
+            search.nodes_expanded += index
+            if index > 0:
+                search.max_search_depth = depth + 1
+            return search.result(vector_bfs.layer_path(layers, index), depth)
+
+        child_layer, generated = vector_bfs.next_layer(layer, previous, n)
+        search.nodes_expanded  += len(layer)
+        search.nodes_generated += generated
+        if len(child_layer):
+            search.max_search_depth = depth + 1
+        search.check_budget()
+
+        previous = layer
+        layers.append(child_layer)
+    return None
+
+def A_star_search(initial_state, search=None):
     """A * search"""
     
-    start_time  = time.time()
-    
-    global path_to_goal, cost_of_path, nodes_expanded, search_depth, max_search_depth, running_time, max_ram_usage
+    search = search or Search()
      
-    #Initialize Priority Queue:
-    frontier = Q.PriorityQueue()
-    frontier.put(initial_state)
+    #Initialize the frontier:
+    frontier = search.frontier("priority")
+    frontier.push(initial_state)
+    search.frontier_size = frontier.__len__
 
     #set of frontier config for testing purposes
-    frontier_set = set()
-    frontier_set.add(tuple(initial_state.config))
+    frontier_set = search.board_set(initial_state.n)
+    frontier_set.add(initial_state.board)
      
     #Initialize explored set:
-    explored = set()
+    explored = search.board_set(initial_state.n)
+
+    state = initial_state
+    search.closed_size = explored.__len__
+    search.bound       = lambda: state.cost + state.h
     
-    while not frontier.empty():
+    while frontier:
         
-        state =  frontier.get()
-        explored.add(tuple(state.config))
+        state =  frontier.pop()
+        explored.add(state.board)
         
         if test_goal(state):
             search_depth = state.cost
-            while(state!=None):
-                path_to_goal.append(state.action)
-                state=state.parent
+            path_to_goal = []
+            node = state
+            while(node!=None):
+                path_to_goal.append(node.action)
+                node=node.parent
                 
-            #prepare stats for writeoutput
+            #prepare stats for the result
             path_to_goal = path_to_goal[::-1]
             path_to_goal = list(path_to_goal[1:])
-            end_time = time.time()
-            t = end_time - start_time
-            
-            write_output(path_to_goal, nodes_expanded, search_depth, max_search_depth,t)
-            return state
+            return search.result(path_to_goal, search_depth)
         
-        children = state.expand()
+        children = state.successors()
         children.reverse()
-        nodes_expanded +=1
+        search.expanded(children)
         for child in children:
-            if (tuple(child.config) not in explored ) and (tuple(child.config) not in frontier_set):
-                frontier_set.add(tuple(child.config))
-                frontier.put(child)
-                if child.cost > max_search_depth:
-                    max_search_depth = child.cost
+            if (child.board not in explored ) and (child.board not in frontier_set):
+                frontier_set.add(child.board)
+                frontier.push(child)
+                if child.cost > search.max_search_depth:
+                    search.max_search_depth = child.cost
     return None
 
 
 
+def ara_search(initial_state, search=None):
+    """
+    Anytime repairing A* (ARA*). A weighted A* ordered by g + w*h finds a
+    first solution quickly, then w is lowered by ARA_STEP and the search
+    goes on from where it stopped to improve the solution, until w is 1 or
+    the solution is proven optimal. Every solution is listed with its cost
+    and a proven bound on cost/optimal cost, as (weight, cost, bound). When the node or time budget
+    runs out, the best solution found so far is returned.
+    """
+    search = search or Search()
+
+    weight = search.weight or ARA_WEIGHT
+    if weight < 1:
+        raise Exception("The heuristic weight of ARA* can not be below 1 : ", weight)
+
+    #board -> cheapest PuzzleState known, boards expanded since the last solution, and boards
+    #improved after being expanded, which wait for the next weight
+    best   = {initial_state.board : initial_state}
+    closed = set()
+    incons = {}
+    frontier = [(weight*initial_state.h, initial_state.h, 0, initial_state)]
+    counter  = 0
+    search.frontier_size = frontier.__len__
+    search.closed_size   = closed.__len__
+    search.bound         = lambda: weight
+
+    incumbent = initial_state if test_goal(initial_state) else None
+
+    #the optimal cost is at least lower_bound, and the incumbent at most proven times it
+    lower_bound = initial_state.h
+    proven      = math.inf
+    solutions   = []
+
+    def current(entry):
+        return best.get(entry[3].board) is entry[3]
+
+    def suboptimality():
+        if incumbent.cost == 0:
+            return 1.0
+        return min(proven, incumbent.cost/lower_bound) if lower_bound else proven
+
+    def answer(stopped=None):
+        path_to_goal = []
+        state = incumbent
+        while state.parent != None:
+            path_to_goal.append(state.action)
+            state = state.parent
+        path_to_goal.reverse()
+        extra = {'solutions' : solutions, 'suboptimality' : suboptimality()}
+        if stopped is not None:
+            extra['stopped'] = stopped
+        return search.result(path_to_goal, incumbent.cost, extra)
+
+    try:
+        while True:
+            #weighted A* until no open board can lead to a cheaper solution under this weight
+            while frontier:
+                if not current(frontier[0]):
+                    heapq.heappop(frontier)
+                    continue
+                if incumbent is not None and incumbent.cost <= frontier[0][0]:
+                    break
+                state = heapq.heappop(frontier)[3]
+                closed.add(state.board)
+                children = state.successors(prune=True)
+                search.expanded(children)
+                for child in children:
+                    known = best.get(child.board)
+                    if known is not None and known.cost <= child.cost:
+                        continue
+                    best[child.board] = child
+                    if child.cost > search.max_search_depth:
+                        search.max_search_depth = child.cost
+                    if test_goal(child) and (incumbent is None or child.cost < incumbent.cost):
+                        incumbent = child
+                    if child.board in closed:
+                        incons[child.board] = child
+                    else:
+                        counter += 1
+                        heapq.heappush(frontier, (child.cost + weight*child.h, child.h, counter, child))
+
+            if incumbent is None:
+                return None
+
+            #every board that could still improve the solution is open or inconsistent
+            pending = [entry[3] for entry in frontier if current(entry)] + list(incons.values())
+            lower_bound = max(lower_bound, min([state.cost + state.h for state in pending] or [incumbent.cost]))
+            proven = weight
+            solutions.append((weight, incumbent.cost, suboptimality()))
+            if weight == 1 or suboptimality() <= 1:
+                return answer()
+
+            #resume with a smaller weight: reopen the inconsistent boards and reorder the open ones
+            weight = max(1.0, weight - ARA_STEP)
+            frontier[:] = []
+            for state in pending:
+                counter += 1
+                frontier.append((state.cost + weight*state.h, state.h, counter, state))
+            heapq.heapify(frontier)
+            closed.clear()
+            incons = {}
+    except SearchCancelled:
+        raise
+    except SearchBudgetExceeded as e:
+        if incumbent is None:
+            raise
+        return answer(str(e))
+
+def hda_search(initial_state, search=None):
+    """Hash distributed A* search over several processes, see hda.py"""
+
+    search = search or Search()
+
+    parallel = hda.HashDistributedAStar(initial_state, search.workers)
+    parallel.start()
+    try:
+        while not parallel.finished():
+            search.nodes_expanded = parallel.nodes_expanded()
+            search.check_budget()
+        path_to_goal = parallel.path() if parallel.cost() is not None else None
+    finally:
+        stats = parallel.stop()
+    if None in stats:
+        raise Exception("HDA* worker process died : ", stats.index(None))
+
+    search.nodes_expanded   = sum(worker[0] for worker in stats)
+    search.max_search_depth = max(worker[3] for worker in stats)
+    #the workers update the heuristic in their own processes
+    if search.heuristics:
+        search.heuristics[0].updates += sum(worker[4] for worker in stats)
+    if path_to_goal is None:
+        return None
+    extra = {
+        'workers'                 : parallel.workers,
+        'worker_expansions'       : [worker[0] for worker in stats],
+        'worker_batches_sent'     : [worker[1] for worker in stats],
+        'worker_batches_received' : [worker[2] for worker in stats],
+    }
+    return search.result(path_to_goal, len(path_to_goal), extra)
+
+def ida_search(initial_state, search=None):
+    """IDA * search"""
+    
+    search = search or Search()
+
+    #(threshold, nodes expanded) of every iteration
+    iterations = []
+    threshold  = initial_state.cost + initial_state.h
+    search.bound = lambda: threshold
+
+    while True:
+        expanded_before = search.nodes_expanded
+        result = ida_bounded_search(initial_state, threshold, search)
+        iterations.append((threshold, search.nodes_expanded - expanded_before))
+
+        if isinstance(result, PuzzleState):
+            state = result
+            search_depth = state.cost
+            path_to_goal = []
+            while(state!=None):
+                path_to_goal.append(state.action)
+                state=state.parent
+
+            #prepare stats for the result
+            path_to_goal = path_to_goal[::-1]
+            path_to_goal = list(path_to_goal[1:])
+            return search.result(path_to_goal, search_depth, {'iterations' : iterations})
+
+        # no node was cut off, the whole space has been searched
+        if result == math.inf:
+            return None
+        threshold = result
+
+def ida_bounded_search(state, threshold, search):
+    """
+    Depth first search below state cut off at f > threshold.
+    Only the current path is kept in memory, and the move undoing the
+    previous one is never generated.
+
+    :return the goal PuzzleState if found, otherwise the smallest f that exceeded threshold
+    """
+    f = state.cost + state.h
+    if f > threshold:
+        return f
+    if test_goal(state):
+        return state
+
+    children = state.successors(prune=True)
+    search.expanded(children)
+    minimum = math.inf
+    for child in children:
+        if child.cost > search.max_search_depth:
+            search.max_search_depth = child.cost
+        result = ida_bounded_search(child, threshold, search)
+        if isinstance(result, PuzzleState):
+            return result
+        if result < minimum:
+            minimum = result
+    return minimum
+
+def bidirectional_path(forward, backward):
+    """
+    Stitches the path to a meeting board: the moves from the initial state to
+    forward, followed by the moves of backward from the goal undone in
+    reverse order.
+
+    :param forward->PuzzleState : meeting board reached from the initial state
+    :param backward->PuzzleState : meeting board reached from the goal
+    :return list of actions
+    """
+    path = []
+    while forward.parent != None:
+        path.append(forward.action)
+        forward = forward.parent
+    path.reverse()
+    while backward.parent != None:
+        path.append(backward.inverse_action[backward.action])
+        backward = backward.parent
+    return path
+
+def bidirectional_result(search, forward, backward, expanded):
+    """the SolveResult of a bidirectional search that met at forward/backward"""
+
+    path_to_goal = bidirectional_path(forward, backward)
+    extra = {
+        'nodes_expanded_forward'  : expanded[0],
+        'nodes_expanded_backward' : expanded[1],
+        'meeting_depth'           : forward.cost,
+    }
+    return search.result(path_to_goal, len(path_to_goal), extra)
+
+def bidirectional_bfs_search(initial_state, search=None):
+    """Bidirectional BFS search"""
+    
+    search = search or Search()
+
+    n = initial_state.n
+    goal_state = PuzzleState(list(range(n*n)), n, heuristic=initial_state.heuristic)
+
+    #board -> PuzzleState reached from each end, index 0 is forward
+    seen     = ({initial_state.board : initial_state}, {goal_state.board : goal_state})
+    layers   = ([initial_state], [goal_state])
+    search.frontier_size = lambda: len(layers[0]) + len(layers[1])
+    search.closed_size   = lambda: len(seen[0]) + len(seen[1])
+    expanded = [0, 0]
+
+    if test_goal(initial_state):
+        return bidirectional_result(search, initial_state, goal_state, expanded)
+
+    while layers[0] and layers[1]:
+
+        #grow the smaller frontier by one full layer
+        side  = 0 if len(layers[0]) <= len(layers[1]) else 1
+        other = seen[1 - side]
+        best  = None
+        layer = []
+
+        for state in layers[side]:
+            children = state.successors(prune=True)
+            expanded[side] +=1
+            search.expanded(children)
+            for child in children:
+                if child.board in seen[side]:
+                    continue
+                seen[side][child.board] = child
+                layer.append(child)
+                if child.cost > search.max_search_depth:
+                    search.max_search_depth = child.cost
+
+                #the whole layer is checked, the other side may have met it at different depths
+                if child.board in other:
+                    meet = (child, other[child.board]) if side == 0 else (other[child.board], child)
+                    if best is None or meet[0].cost + meet[1].cost < best[0].cost + best[1].cost:
+                        best = meet
+
+        if best is not None:
+            return bidirectional_result(search, best[0], best[1], expanded)
+
+        layers = (layer, layers[1]) if side == 0 else (layers[0], layer)
+    return None
+
+def mm_search(initial_state, search=None):
+    """
+    Bidirectional heuristic search (MM): both directions order their open
+    lists by max(f, 2g), so they meet in the middle, and stop as soon as the
+    best meeting found is no longer than the smallest priority.
+    """
+    search = search or Search()
+
+    n = initial_state.n
+    goal_state = PuzzleState(list(range(n*n)), n,
+                             heuristic=search.counted(heuristics.TargetManhattanHeuristic(initial_state.config, n)))
+
+    #per direction, index 0 is forward: priority queue, open and closed boards
+    frontier = ([], [])
+    opened   = ({initial_state.board : initial_state}, {goal_state.board : goal_state})
+    search.frontier_size = lambda: len(opened[0]) + len(opened[1])
+    search.closed_size   = lambda: len(closed[0]) + len(closed[1])
+    closed   = ({}, {})
+    expanded = [0, 0]
+    counter  = 0
+
+    for side, state in ((0, initial_state), (1, goal_state)):
+        heapq.heappush(frontier[side], (max(state.cost + state.h, 2*state.cost), counter, state))
+
+    best = (initial_state, goal_state) if test_goal(initial_state) else None
+    best_cost = 0 if best is not None else math.inf
+
+    while frontier[0] and frontier[1]:
+
+        #drop entries superseded by a cheaper path
+        for side in (0, 1):
+            while frontier[side] and opened[side].get(frontier[side][0][2].board) is not frontier[side][0][2]:
+                heapq.heappop(frontier[side])
+        if not frontier[0] or not frontier[1]:
+            break
+
+        lower_bound = min(frontier[0][0][0], frontier[1][0][0])
+        if best_cost <= lower_bound:
+            break
+
+        side = 0 if frontier[0][0][0] <= frontier[1][0][0] else 1
+        state = heapq.heappop(frontier[side])[2]
+        del opened[side][state.board]
+        closed[side][state.board] = state
+        children = state.successors(prune=True)
+        expanded[side] +=1
+        search.expanded(children)
+
+        for child in children:
+            known = opened[side].get(child.board) or closed[side].get(child.board)
+            if known is not None and known.cost <= child.cost:
+                continue
+            closed[side].pop(child.board, None)
+            opened[side][child.board] = child
+            counter += 1
+            heapq.heappush(frontier[side], (max(child.cost + child.h, 2*child.cost), counter, child))
+            if child.cost > search.max_search_depth:
+                search.max_search_depth = child.cost
+
+            match = opened[1 - side].get(child.board) or closed[1 - side].get(child.board)
+            if match is not None and child.cost + match.cost < best_cost:
+                best_cost = child.cost + match.cost
+                best = (child, match) if side == 0 else (match, child)
+
+    if best is None:
+        return None
+    return bidirectional_result(search, best[0], best[1], expanded)
+
+def table_search(initial_state, search=None):
+    """
+    Reads the optimal path out of the precomputed solution table of the
+    board size (see solution_table.py), no search is needed.
+    """
+    search = search or Search()
+
+    n = initial_state.n
+    if not ranking.is_reachable(initial_state.config, n):
+        return None
+
+    table = solution_table.load_table(n)
+    path_to_goal = table.solve(initial_state)
+
+    # every step is one table lookup
+    search.nodes_expanded = search.max_search_depth = len(path_to_goal)
+    return search.result(path_to_goal, len(path_to_goal))
+
+def macro_search(initial_state, search=None):
+    """
+    Builds a solution row by row and column by column with constructive.py,
+    in polynomial time for any board size. The solution is not optimal.
+    """
+    search = search or Search()
+
+    n = initial_state.n
+    path_to_goal = constructive.solve_rows(initial_state.config, n)
+    if path_to_goal is None:
+        return None
+    extra = {}
+    if search.shorten:
+        extra['unshortened_cost'] = len(path_to_goal)
+        path_to_goal = constructive.shorten(initial_state.config, n, path_to_goal)
+
+    # the tiles are placed directly, no node is expanded
+    search.max_search_depth = len(path_to_goal)
+    return search.result(path_to_goal, len(path_to_goal), extra)
+
 def test_goal(puzzle_state):
     """test the state is the goal state or not"""
 
-    for i in range(1, puzzle_state.n ** 2):
-        if ((puzzle_state.config[i] - 1) != puzzle_state.config[i-1]):
-            return False
-    
-    return True
+    return puzzle_state.board == goal_board(puzzle_state.n)
+
+search_modes = {
+    "bfs"   : bfs_search,
+    "vbfs"  : vector_bfs_search,
+    "ebfs"  : external_bfs_search,
+    "dfs"   : dfs_search,
+    "ast"   : A_star_search,
+    "ara"   : ara_search,
+    "ida"   : ida_search,
+    "hda"   : hda_search,
+    "bibfs" : bidirectional_bfs_search,
+    "mm"    : mm_search,
+    "table" : table_search,
+    "macro" : macro_search,
+}
+
+#search modes scoring boards with the heuristic, the others only walk the board graph
+heuristic_modes = {"ast", "ara", "ida", "hda", "mm"}
+
+#search modes whose solutions are optimal when the heuristic is admissible, ara is when it
+#reaches a suboptimality of 1
+optimal_modes = {"bfs", "vbfs", "ebfs", "ida", "hda", "bibfs", "mm", "table"}
+
+def cache_name(algorithm, heuristic, weight=None, shorten=False):
+    """
+    Name the solutions of a search are cached under: the search mode and
+    the options that change which solution it finds.
+    :param heuristic : spec or heuristic object
+    """
+    name = algorithm
+    if algorithm in heuristic_modes:
+        name += ":" + (heuristic.strip().lower() if isinstance(heuristic, str) else heuristic.name)
+    if algorithm == "ara":
+        name += ":w=%g" % (weight or ARA_WEIGHT)
+    if algorithm == "macro" and shorten:
+        name += ":shorten"
+    return name
+
+def proven_optimal(algorithm, result):
+    """True when result is known to be an optimal solution"""
+    if algorithm == "ara":
+        return 'stopped' not in result.extra and result.extra.get('suboptimality', math.inf) <= 1
+    return algorithm in optimal_modes
+
+def solve(board, algorithm="ast", heuristic="manhattan", max_nodes=None, max_seconds=None, closed_set="hash",
+          priority_queue="heap", workers=None, search=None, telemetry=None, cache=None,
+          weight=None, shorten=False, layers_directory=None, **options):
+    """
+    Solves a board in this process. Nothing is written to disk but the cache
+    file and the layers of the ebfs mode when they are asked for, and every
+    call is independent, so it can be used repeatedly and from several threads.
+
+    :param board : list of tiles or comma separated string, 0 is the blank
+    :param algorithm->string : one of search_modes
+    :param heuristic : spec for heuristics.get_heuristic, or a heuristic object, used by the heuristic_modes
+    :param max_nodes->int : maximum number of nodes expanded
+    :param max_seconds->float : maximum running time
+    :param closed_set->string : 'hash', 'bitset' or 'auto', see ranking.board_set
+    :param priority_queue->string : 'heap', 'bucket' or 'bucket-deep', see frontier.py
+    :param workers->int : processes of the hda mode, None for one per core
+    :param search->Search : runs with this Search instead of a new one made from the limits above,
+                            so another thread can watch its progress() or cancel() it
+    :param telemetry->telemetry.Telemetry : takes periodic snapshots of the search
+    :param cache->solution_cache.SolutionCache : answers boards, or their transposes, solved before by the
+                                                 same algorithm with the same options, see cache_name, and
+                                                 stores new solutions that are proven optimal
+    :param weight->float : first heuristic weight of the ara mode, None for ARA_WEIGHT
+    :param shorten->bool : let the macro mode shorten its solution
+    :param layers_directory->string : folder where the ebfs mode keeps its layers, to resume an interrupted search
+    :param options : heuristic options, e.g. directory and partition for pdb
+    :return SolveResult
+    """
+    if algorithm not in search_modes:
+        raise Exception("Unknown algorithm, choose from %s : " % ", ".join(sorted(search_modes)), algorithm)
+    if isinstance(board, str):
+        board = board.split(",")
+    board = list(map(int, board))
+    n = int(math.sqrt(len(board)))
+
+    search = search or Search(max_nodes, max_seconds, closed_set, priority_queue, workers, telemetry, weight,
+                              shorten, layers_directory)
+    if cache is not None:
+        cached_as = cache_name(algorithm, heuristic, search.weight, search.shorten)
+        path_to_goal = cache.get(cached_as, board, n)
+        if path_to_goal is not None:
+            search.max_search_depth = len(path_to_goal)
+            return search.result(path_to_goal, len(path_to_goal), {'cache' : "hit"})
+
+    if algorithm in heuristic_modes:
+        if isinstance(heuristic, str):
+            heuristic = heuristics.get_heuristic(heuristic, n, **options)
+        heuristic = search.counted(heuristic)
+    else:
+        #the cheapest heuristic for modes that never read h, no pattern database is built for them
+        heuristic = heuristics.manhattan
+
+    initial_state = PuzzleState(board, n, heuristic=heuristic)
+    #an unsolvable board would make the searches go through half of the state space first
+    if not ranking.is_reachable(board, n):
+        return search.failure("unsolvable", "the parity of the permutation does not match the blank's position")
+    try:
+        result = search_modes[algorithm](initial_state, search)
+    except SearchCancelled:
+        return search.failure("cancelled")
+    except SearchBudgetExceeded as e:
+        return search.failure("budget_exceeded", str(e))
+    if result is None:
+        return search.failure("unsolvable")
+    #another search, or the same one with other options, may find a shorter solution than a suboptimal one
+    if cache is not None and proven_optimal(algorithm, result):
+        cache.put(cached_as, board, n, result.path_to_goal)
+    return result
 
 # Main Function that reads in Input and Runs corresponding Algorithm
 def main():
-    search_mode = sys.argv[1].lower()
-    begin_state = sys.argv[2].split(",")
-    begin_state = list(map(int, begin_state))
-    board_size  = int(math.sqrt(len(begin_state)))
-    hard_state  = PuzzleState(begin_state, board_size)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import batch
+        return batch.main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(description="Solve an N-puzzle board")
+    parser.add_argument("search_mode", help="bfs, vbfs, ebfs, dfs, ast, ara, ida, hda, bibfs, mm, table or macro (or 'batch', see batch.py)")
+    parser.add_argument("board", help="comma separated tiles, 0 is the blank, e.g. 1,3,5,0,4,2,6,7,8")
+    parser.add_argument("--heuristic", default="manhattan",
+                        help="manhattan, linear-conflict, walking-distance, pdb or max(...) of them")
+    parser.add_argument("--pdb-dir", default=pattern_db.DEFAULT_DIRECTORY, help="folder of the pattern database files")
+    parser.add_argument("--partition", help="pattern database groups, e.g. 1,2,3,4/5,6,7,8")
+    parser.add_argument("--closed-set", choices=["hash", "bitset", "auto"], default="hash",
+                        help="explored set backend, bitset ranks boards into a bit array when it fits")
+    parser.add_argument("--priority-queue", choices=frontiers.PRIORITY_QUEUES, default="heap",
+                        help="frontier of A*, bucket queues index states by f and break ties LIFO or by depth")
+    parser.add_argument("--workers", type=int, help="processes of the hda mode, defaults to the number of cores")
+    parser.add_argument("--weight", type=float, help="first heuristic weight of the ara mode, default %.1f" % ARA_WEIGHT)
+    parser.add_argument("--shorten", action="store_true", help="shorten the solution of the macro mode")
+    parser.add_argument("--layers-dir", help="folder where the ebfs mode keeps its layers, a search of the same board resumes from it")
+    parser.add_argument("--time-budget", type=float, help="seconds after which the search gives up, ara returns its best solution")
+    parser.add_argument("--node-budget", type=int, help="expansions after which the search gives up, ara returns its best solution")
+    parser.add_argument("--telemetry", help="time series of the search, CSV if the name ends in .csv, JSON otherwise")
+    parser.add_argument("--telemetry-interval", type=float, default=1.0, help="seconds between two snapshots")
+    parser.add_argument("--progress", action="store_true", help="print every snapshot to stderr")
+    parser.add_argument("--memory", choices=["rss", "tracemalloc"], default="rss",
+                        help="tracemalloc traces the Python heap too, exact but slower")
+    parser.add_argument("--profile", help="run under cProfile and dump the statistics to this file")
+    parser.add_argument("--cache", help="sqlite file of solutions kept across runs, see solution_cache.py")
+    parser.add_argument("--cache-size", type=int, default=solution_cache.DEFAULT_DISK_CAPACITY,
+                        help="solutions kept in the cache file, the least recently used are evicted")
+    args = parser.parse_args()
+
+    search_mode = args.search_mode.lower()
+    partition   = pattern_db.parse_partition(args.partition) if args.partition else None
     start_time  = time.time()
     
-    if   search_mode == "bfs": bfs_search(hard_state)
-    elif search_mode == "dfs": dfs_search(hard_state)
-    elif search_mode == "ast": A_star_search(hard_state)
+    telemetry = None
+    if args.telemetry or args.progress or args.memory == "tracemalloc":
+        telemetry = telemetry_hooks.Telemetry(args.telemetry_interval, telemetry_hooks.print_snapshot if args.progress else None,
+                                              args.telemetry, args.memory)
+
+    cache = solution_cache.SolutionCache(args.cache, disk_capacity=args.cache_size) if args.cache else None
+
+    if search_mode in search_modes:
+        run = telemetry_hooks.profiled if args.profile else lambda path, function, *a, **kw: function(*a, **kw)
+        result = run(args.profile, solve, args.board, search_mode, args.heuristic, args.node_budget, args.time_budget,
+                     weight=args.weight, shorten=args.shorten, layers_directory=args.layers_dir, closed_set=args.closed_set,
+                     priority_queue=args.priority_queue, workers=args.workers, telemetry=telemetry, cache=cache,
+                     directory=args.pdb_dir, partition=partition)
+        if cache is not None:
+            cache.close()
+        if result.status == "solved":
+            write_output(result)
+        else:
+            print("No solution found !" + (" (%s)" % result.reason if result.reason else ""))
     else: 
         print("Enter valid command arguments !")
         
@@ -0,0 +1,200 @@
+"""
+Perfect hashing of permutations and bitset-backed sets of boards.
+
+rank_partial/unrank_partial number the arrangements of k distinct values
+taken from range(size) in lexicographic order (the Lehmer code), so a full
+permutation is the case k == size. myrvold_ruskey_rank/unrank give a
+non-lexicographic numbering in linear time.
+
+A board's rank only needs half of the n*n! permutations, since the other
+half can not be reached. BoardBitSet stores one bit per rank, which is
+about 23KB for the 181,440 boards of the 8-puzzle.
+"""
+import math
+
+from PuzzleState import tile_bits
+
+def partial_count(size, k):
+    """number of ways to arrange k distinct values out of range(size)"""
+    count = 1
+    for i in range(k):
+        count *= size - i
+    return count
+
+def rank_partial(sequence, size):
+    """
+    Lexicographic rank of an arrangement of distinct values.
+    :param sequence->sequence : k distinct values of range(size)
+    :param size->int : number of values available
+    :return int in [0, partial_count(size, k))
+    """
+    rank = 0
+    used = 0
+    for i, value in enumerate(sequence):
+        # values taken by earlier positions are not available to this one
+        rank = rank*(size - i) + value - bin(used & ((1 << value) - 1)).count("1")
+        used |= 1 << value
+    return rank
+
+def unrank_partial(rank, k, size):
+    """inverse of rank_partial"""
+    digits = []
+    for i in range(k - 1, -1, -1):
+        rank, digit = divmod(rank, size - i)
+        digits.append(digit)
+    available = list(range(size))
+    return [available.pop(digit) for digit in reversed(digits)]
+
+def rank_permutation(perm):
+    """lexicographic rank of a permutation of range(len(perm))"""
+    return rank_partial(perm, len(perm))
+
+def unrank_permutation(rank, size):
+    """inverse of rank_permutation"""
+    return unrank_partial(rank, size, size)
+
+def myrvold_ruskey_rank(perm):
+    """
+    Rank of a permutation of range(len(perm)) in O(n), as in Myrvold and
+    Ruskey, "Ranking and unranking permutations in linear time".
+    """
+    perm = list(perm)
+    inverse = [0]*len(perm)
+    for i, value in enumerate(perm):
+        inverse[value] = i
+
+    rank = 0
+    multiplier = 1
+    for size in range(len(perm), 1, -1):
+        value = perm[size - 1]
+        # swap the last element with the position of size-1
+        perm[size - 1], perm[inverse[size - 1]] = perm[inverse[size - 1]], perm[size - 1]
+        inverse[value], inverse[size - 1] = inverse[size - 1], inverse[value]
+        rank += value*multiplier
+        multiplier *= size
+    return rank
+
+def myrvold_ruskey_unrank(rank, size):
+    """inverse of myrvold_ruskey_rank"""
+    perm = list(range(size))
+    for n in range(size, 0, -1):
+        rank, digit = divmod(rank, n)
+        perm[n - 1], perm[digit] = perm[digit], perm[n - 1]
+    return perm
+
+def board_count(n):
+    """number of boards reachable from the goal, half of all arrangements"""
+    return math.factorial(n*n)//2
+
+def rank_board(board, n):
+    """
+    Perfect hash of a packed board into [0, board_count(n)): the blank's
+    index, then the order of the tiles except the last two, which parity
+    decides for a reachable board.
+
+    :param board->int : packed board, see PuzzleState.encode_config
+    :param n->int : Size of the board
+    """
+    cells = n*n
+    w = tile_bits(n)
+    mask = (1 << w) - 1
+    tiles = []
+    blank = 0
+    for idx in range(cells):
+        tile = (board >> (idx*w)) & mask
+        if tile == 0:
+            blank = idx
+        else:
+            tiles.append(tile - 1)
+    return blank*(math.factorial(cells - 1)//2) + rank_partial(tiles[:cells - 3], cells - 1)
+
+def unrank_board(rank, n):
+    """
+    Configuration of the reachable board with the given rank_board rank.
+    :return List
+    """
+    cells = n*n
+    half = math.factorial(cells - 1)//2
+    blank, rank = divmod(rank, half)
+    tiles = [tile + 1 for tile in unrank_partial(rank, cells - 3, cells - 1)]
+    rest = sorted(set(range(1, cells)) - set(tiles))
+
+    for last in (rest, rest[::-1]):
+        config = tiles + last
+        config.insert(blank, 0)
+        if is_reachable(config, n):
+            return config
+
+def is_reachable(config, n):
+    """
+    True when config can be reached from the goal: the parity of the
+    permutation must match the parity of the blank's distance from its goal.
+    """
+    inversions = 0
+    seen = 0
+    for value in reversed(config):
+        inversions += bin(seen & ((1 << value) - 1)).count("1")
+        seen |= 1 << value
+    blank = config.index(0)
+    return inversions % 2 == (blank // n + blank % n) % 2
+
+
+class BitSet(object):
+    """Fixed size set of small integers, one bit each"""
+    def __init__(self, size):
+        self.bits  = bytearray((size + 7) // 8)
+        self.count = 0
+
+    def add(self, i):
+        byte, bit = i >> 3, 1 << (i & 7)
+        if not self.bits[byte] & bit:
+            self.bits[byte] |= bit
+            self.count += 1
+
+    def __contains__(self, i):
+        return bool(self.bits[i >> 3] & (1 << (i & 7)))
+
+    def __len__(self):
+        return self.count
+
+
+class BoardBitSet(object):
+    """
+        Set of packed boards of one size backed by a BitSet indexed by
+        rank_board. Only boards reachable from the goal can be stored.
+    """
+    def __init__(self, n):
+        self.n    = n
+        self.bits = BitSet(board_count(n))
+
+    def add(self, board):
+        self.bits.add(rank_board(board, self.n))
+
+    def __contains__(self, board):
+        return rank_board(board, self.n) in self.bits
+
+    def __len__(self):
+        return len(self.bits)
+
+    def nbytes(self):
+        return len(self.bits.bits)
+
+# largest bit array board_set chooses by default, in bytes
+DENSE_LIMIT = 64*1024*1024
+
+def board_set(n, backend="auto", limit=DENSE_LIMIT):
+    """
+    New empty set of packed boards.
+    :param n->int : Size of the board
+    :param backend->string : 'hash' for a Python set, 'bitset' for BoardBitSet,
+                             'auto' for BoardBitSet when it takes at most limit bytes
+    :param limit->int : largest bit array in bytes, 'bitset' raises an exception above it
+    """
+    if backend not in ("hash", "bitset", "auto"):
+        raise Exception("Unknown closed set backend, choose from auto, bitset or hash : ", backend)
+    fits = board_count(n) // 8 <= limit
+    if backend == "bitset" and not fits:
+        raise Exception("Bitset closed set of this board size exceeds the limit of %d bytes : " % limit, board_count(n) // 8)
+    if backend != "hash" and fits:
+        return BoardBitSet(n)
+    return set()
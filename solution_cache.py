@@ -0,0 +1,198 @@
+"""
+Cache of solved boards.
+
+Solutions are keyed by the name of the search, its mode and the options
+that change its solution (see puzzle.cache_name), and the packed board
+(see PuzzleState.encode_config). puzzle.solve only stores solutions that
+are proven optimal. Transposing a board about its main diagonal,
+and renumbering the tiles to match, keeps the goal in place and swaps Up
+with Left and Down with Right. A board and its transpose are therefore
+stored once, under the smaller of the two encodings, and a cached path is
+mapped back to the orientation it is asked for.
+
+Recent entries are kept in an in-memory LRU. An optional sqlite file keeps
+them across runs, both layers are bounded and evict the least recently used
+entries first:
+
+    python puzzle.py ida 1,3,5,0,4,2,6,7,8 --cache solutions.sqlite
+    python solution_cache.py stats --file solutions.sqlite
+"""
+from __future__ import print_function
+
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+
+from PuzzleState import encode_config
+
+#entries held in memory
+DEFAULT_CAPACITY = 10000
+
+#entries kept in the sqlite file
+DEFAULT_DISK_CAPACITY = 1000000
+
+#moves of a board and of its transpose
+TRANSPOSED_ACTIONS = {"Up" : "Left", "Left" : "Up", "Down" : "Right", "Right" : "Down"}
+
+#one letter per move in the sqlite file
+LETTERS = {"Up" : "U", "Down" : "D", "Left" : "L", "Right" : "R"}
+ACTIONS = {letter : action for action, letter in LETTERS.items()}
+
+def transpose_config(config, n):
+    """
+    Mirror image of a board about its main diagonal. The tile at (row, col)
+    moves to (col, row) and is renamed after its home cell, so the goal is
+    its own transpose.
+    """
+    transposed = [0]*(n*n)
+    for i, value in enumerate(config):
+        row, col = divmod(i, n)
+        transposed[col*n + row] = (value % n)*n + value//n
+    return transposed
+
+def canonical(config, n):
+    """
+    :return (packed board, transposed) where the board is the smaller encoding of
+            config and its transpose, and transposed tells which one it is
+    """
+    board = encode_config(config, n)
+    mirror = encode_config(transpose_config(config, n), n)
+    return (mirror, True) if mirror < board else (board, False)
+
+def transpose_path(path):
+    return [TRANSPOSED_ACTIONS[action] for action in path]
+
+
+class SolutionCache(object):
+    """
+        LRU of solutions with an optional sqlite store. Safe to share
+        between threads.
+    """
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, disk_capacity=DEFAULT_DISK_CAPACITY):
+        """
+        :param path->string : sqlite file, None to only cache in memory
+        :param capacity->int : entries kept in memory
+        :param disk_capacity->int : entries kept in the sqlite file
+        """
+        self.path          = path
+        self.capacity      = capacity
+        self.disk_capacity = disk_capacity
+        self.entries       = OrderedDict()
+        self.lock          = threading.Lock()
+
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+        self.db = None
+        if path is not None:
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS solutions (algorithm TEXT, n INTEGER, board TEXT, "
+                            "path TEXT, used REAL, PRIMARY KEY (algorithm, n, board))")
+            self.db.execute("CREATE INDEX IF NOT EXISTS solutions_used ON solutions (used)")
+            self.db.commit()
+
+    def get(self, algorithm, config, n):
+        """
+        :param algorithm->string : name of the search that solved the board, see puzzle.cache_name
+        :param config->List : board configuration
+        :param n->int : Size of the board
+        :return list of actions solving config, None if not cached
+        """
+        board, transposed = canonical(config, n)
+        key = (algorithm, n, board)
+        with self.lock:
+            path = self.entries.get(key)
+            if path is not None:
+                self.entries.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute("SELECT path FROM solutions WHERE algorithm = ? AND n = ? AND board = ?",
+                                      (algorithm, n, "%x" % board)).fetchone()
+                if row is not None:
+                    path = [ACTIONS[letter] for letter in row[0]]
+                    self.db.execute("UPDATE solutions SET used = ? WHERE algorithm = ? AND n = ? AND board = ?",
+                                    (time.time(), algorithm, n, "%x" % board))
+                    self.db.commit()
+                    self.remember(key, path)
+
+            if path is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return transpose_path(path) if transposed else list(path)
+
+    def put(self, algorithm, config, n, path):
+        """stores the solution path of config found by algorithm"""
+        board, transposed = canonical(config, n)
+        key = (algorithm, n, board)
+        path = transpose_path(path) if transposed else list(path)
+        with self.lock:
+            self.remember(key, path)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)",
+                                (algorithm, n, "%x" % board, "".join(LETTERS[action] for action in path), time.time()))
+                excess = self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0] - self.disk_capacity
+                if excess > 0:
+                    self.db.execute("DELETE FROM solutions WHERE rowid IN "
+                                    "(SELECT rowid FROM solutions ORDER BY used LIMIT ?)", (excess,))
+                    self.evictions += excess
+                self.db.commit()
+
+    def remember(self, key, path):
+        """adds an entry to the LRU, evicting the oldest ones beyond capacity"""
+        self.entries[key] = path
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """hit and miss counters and the number of entries of both layers"""
+        stats = {
+            "hits"      : self.hits,
+            "misses"    : self.misses,
+            "evictions" : self.evictions,
+            "entries"   : len(self.entries),
+        }
+        if self.db is not None:
+            with self.lock:
+                stats["stored"] = self.db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM solutions")
+                self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or empty a solution cache file")
+    parser.add_argument("command", choices=["stats", "clear"])
+    parser.add_argument("--file", required=True, help="sqlite file of the cache")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.file):
+        raise Exception("Solution cache not found : ", args.file)
+    cache = SolutionCache(args.file)
+    if args.command == "clear":
+        cache.clear()
+    else:
+        for algorithm, n, count, moves in cache.db.execute(
+                "SELECT algorithm, n, COUNT(*), SUM(LENGTH(path)) FROM solutions GROUP BY algorithm, n ORDER BY algorithm, n"):
+            print("%-24s %dx%d : %9d boards, %.1f moves on average" % (algorithm, n, n, count, moves/count))
+    cache.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Complete solution tables for small boards.
+
+A breadth first search backward from the goal visits every reachable board
+once and stores, at the board's ranking.rank_board index, one byte holding
+the optimal distance and the move that starts an optimal path. The 8-puzzle
+table is 181,440 bytes. Tables are memory-mapped, and solving is a walk
+along the stored moves with no search at all:
+
+    python solution_table.py build --size 3
+    python solution_table.py check --size 3
+    python puzzle.py table 1,3,5,0,4,2,6,7,8
+"""
+from __future__ import print_function
+
+import os
+import sys
+import mmap
+import time
+import struct
+import argparse
+from collections import deque
+
+from PuzzleState import PuzzleState, encode_config
+import ranking
+
+# Header: magic, format version, board size
+HEADER = struct.Struct("<4sBB")
+MAGIC = b"NSOL"
+VERSION = 1
+
+# byte = distance << 2 | move, moves in the order of PuzzleState.heap_order
+MOVES = ["Up", "Down", "Left", "Right"]
+UNREACHED = 255
+
+# the table is limited by the distance fitting in 6 bits and by its size
+MAX_SIZE = 3
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tables")
+
+_tables = {}
+
+def table_path(n, directory=DEFAULT_DIRECTORY):
+    """file holding the table of n*n boards"""
+    return os.path.join(directory, "solutions-%dx%d.bin" % (n, n))
+
+def build_solution_table(n):
+    """
+    Breadth first search from the goal over all reachable boards.
+    :param n->int : Size of the board
+    :return bytearray indexed by ranking.rank_board
+    """
+    if n > MAX_SIZE:
+        raise Exception("Solution tables are only practical up to %dx%d boards : " % (MAX_SIZE, MAX_SIZE), n)
+
+    table = bytearray([UNREACHED])*ranking.board_count(n)
+    goal = PuzzleState(list(range(n*n)), n)
+    table[ranking.rank_board(goal.board, n)] = 0
+
+    frontier = deque([goal])
+    while frontier:
+        state = frontier.popleft()
+        distance = table[ranking.rank_board(state.board, n)] >> 2
+        for child in state.successors():
+            rank = ranking.rank_board(child.board, n)
+            if table[rank] != UNREACHED:
+                continue
+            # the way back to the parent starts an optimal path from the child
+            table[rank] = (distance + 1) << 2 | MOVES.index(child.inverse_action[child.action])
+            child.parent = None
+            frontier.append(child)
+    return table
+
+def write_solution_table(path, n, table):
+    """writes a table built by build_solution_table to path"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n))
+        f.write(table)
+
+
+class SolutionTable(object):
+    """
+        Read only, memory-mapped solution table of one board size.
+    """
+    def __init__(self, path, n=None):
+        """
+        :param path->string : table file
+        :param n->int : expected board size
+        """
+        if not os.path.exists(path):
+            raise Exception("Solution table not found, build it with 'python solution_table.py build' : ", path)
+
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.n = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("Not a solution table file : ", path)
+        if n is not None and n != self.n:
+            raise Exception("Solution table is for another board size : ", path)
+        if len(self.mm) != HEADER.size + ranking.board_count(self.n):
+            raise Exception("Solution table file is truncated : ", path)
+        self.path = path
+
+    def lookup(self, board):
+        """
+        :param board->int : packed reachable board
+        :return (optimal distance, name of the first move)
+        """
+        value = self.mm[HEADER.size + ranking.rank_board(board, self.n)]
+        return value >> 2, MOVES[value & 3]
+
+    def solve(self, state):
+        """
+        Follows the stored moves from state to the goal.
+        :param state->PuzzleState : reachable board of this table's size
+        :return list of actions
+        """
+        path = []
+        distance, move = self.lookup(state.board)
+        while distance > 0:
+            state = getattr(state, "move_" + move.lower())()
+            path.append(move)
+            distance, move = self.lookup(state.board)
+        return path
+
+    def values(self):
+        return self.mm[HEADER.size:]
+
+    def close(self):
+        self.mm.close()
+
+def load_table(n, directory=DEFAULT_DIRECTORY):
+    """SolutionTable of n*n boards, opened once per process and directory"""
+    key = (n, directory)
+    if key not in _tables:
+        _tables[key] = SolutionTable(table_path(n, directory), n)
+    return _tables[key]
+
+def check(n, directory):
+    """verifies a table: full coverage, and that every stored move goes one step closer"""
+    table = SolutionTable(table_path(n, directory), n)
+    values = table.values()
+    problems = []
+    if UNREACHED in values:
+        problems.append("%d unreached boards" % values.count(UNREACHED))
+
+    for rank in range(len(values)):
+        distance = values[rank] >> 2
+        if distance == 0:
+            continue
+        state = PuzzleState(ranking.unrank_board(rank, n), n)
+        child = getattr(state, "move_" + MOVES[values[rank] & 3].lower())()
+        if child is None or table.lookup(child.board)[0] != distance - 1:
+            problems.append("move of rank %d does not get closer" % rank)
+            break
+
+    if table.lookup(encode_config(range(n*n), n))[0] != 0:
+        problems.append("goal is not at distance 0")
+
+    if problems:
+        print("FAIL", table.path, ":", ", ".join(problems))
+    else:
+        print("OK", table.path, ": %d boards, max distance %d" % (len(values), max(values) >> 2))
+    table.close()
+    return not problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check complete solution tables")
+    parser.add_argument("command", choices=["build", "check"])
+    parser.add_argument("--size", type=int, default=3, help="board size n of the n*n puzzle, at most %d" % MAX_SIZE)
+    parser.add_argument("--dir", default=DEFAULT_DIRECTORY, help="folder of the table files")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start_time = time.time()
+        table = build_solution_table(args.size)
+        path = table_path(args.size, args.dir)
+        write_solution_table(path, args.size, table)
+        print("%s : %d boards, max distance %d, built in %.3f second(s)" % (path, len(table), max(table) >> 2, time.time() - start_time))
+    elif not check(args.size, args.dir):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
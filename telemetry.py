@@ -0,0 +1,178 @@
+"""
+Instrumentation of the searches.
+
+A Telemetry attached to a puzzle.Search takes a snapshot every few
+seconds of the search's counters and of the process memory. It hands each
+snapshot to a callback and can stream them to a CSV file or collect them
+in a JSON file:
+
+    python puzzle.py ast <board> --telemetry series.csv --telemetry-interval 0.5
+    python puzzle.py ida <board> --progress --memory tracemalloc
+    python puzzle.py bfs <board> --profile bfs.prof
+
+Peak memory is the peak resident set size the kernel records for the
+process, not a sample taken after the search. It is the peak since the
+process started, so over several solves in one process (batch, the GUI)
+it only grows; the change of RSS over one search is reported beside it. With memory='tracemalloc'
+the current and peak size of the Python heap are tracked as well, which
+is exact but slows the search down.
+"""
+from __future__ import print_function
+
+import sys
+import csv
+import json
+import time
+import cProfile
+import pstats
+import tracemalloc
+
+import psutil
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#expansions between two looks at the clock
+CHECK_EVERY = 1024
+
+FIELDS = ["time", "nodes_expanded", "nodes_generated", "nodes_per_second", "frontier_size",
+          "closed_size", "bound", "rss_kb", "peak_rss_kb", "traced_kb", "traced_peak_kb"]
+
+def rss():
+    """current resident set size of this process in KB"""
+    return psutil.Process().memory_info().rss/1000
+
+def peak_rss():
+    """peak resident set size of this process in KB, as recorded by the kernel"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, KiB elsewhere
+        return peak/1000 if sys.platform == "darwin" else peak*1024/1000
+    info = psutil.Process().memory_info()
+    return getattr(info, "peak_wset", info.rss)/1000
+
+
+class Telemetry(object):
+    """
+        Periodic snapshots of a search. Engines expose their frontier and
+        closed set sizes and their current f-bound or depth through the
+        frontier_size, closed_size and bound callables of puzzle.Search.
+    """
+    def __init__(self, interval=1.0, callback=None, path=None, memory="rss"):
+        """
+        :param interval->float : seconds between two snapshots
+        :param callback : called with every snapshot, a dict of FIELDS
+        :param path->string : file for the time series, CSV if it ends in .csv, JSON otherwise
+        :param memory->string : 'rss', or 'tracemalloc' to trace the Python heap as well
+        """
+        if memory not in ("rss", "tracemalloc"):
+            raise Exception("Unknown memory tracking, choose from rss or tracemalloc : ", memory)
+        self.interval  = interval
+        self.callback  = callback
+        self.path      = path
+        self.memory    = memory
+        self.snapshots = []
+
+        self.next_check = CHECK_EVERY
+        self.next_time  = None
+        self.last       = None
+        self.file       = None
+        self.writer     = None
+        #True when start() turned tracemalloc on, so finish() turns it off again
+        self.tracing    = False
+
+    def start(self, search):
+        """called by puzzle.Search when the search starts, a Telemetry can watch several searches in turn"""
+        self.snapshots  = []
+        self.next_check = search.nodes_expanded + CHECK_EVERY
+        self.tracing    = self.memory == "tracemalloc" and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        if self.path is not None and self.path.endswith(".csv"):
+            self.file = open(self.path, "w")
+            self.writer = csv.DictWriter(self.file, FIELDS)
+            self.writer.writeheader()
+        self.next_time = search.start_time + self.interval
+        self.last = (search.start_time, 0)
+
+    def tick(self, search):
+        """called by puzzle.Search every CHECK_EVERY expansions"""
+        self.next_check = search.nodes_expanded + CHECK_EVERY
+        if time.time() >= self.next_time:
+            self.snapshot(search)
+
+    def snapshot(self, search):
+        """records the current state of search"""
+        now = time.time()
+        last_time, last_expanded = self.last
+        self.last = (now, search.nodes_expanded)
+        self.next_time = now + self.interval
+
+        snapshot = {
+            "time"             : now - search.start_time,
+            "nodes_expanded"   : search.nodes_expanded,
+            "nodes_generated"  : search.nodes_generated,
+            "nodes_per_second" : (search.nodes_expanded - last_expanded)/(now - last_time) if now > last_time else 0.0,
+            "frontier_size"    : search.frontier_size() if search.frontier_size is not None else None,
+            "closed_size"      : search.closed_size() if search.closed_size is not None else None,
+            "bound"            : search.bound() if search.bound is not None else None,
+            "rss_kb"           : rss(),
+            "peak_rss_kb"      : peak_rss(),
+            "traced_kb"        : None,
+            "traced_peak_kb"   : None,
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot["traced_kb"], snapshot["traced_peak_kb"] = current/1000, peak/1000
+
+        self.snapshots.append(snapshot)
+        if self.writer is not None:
+            self.writer.writerow(snapshot)
+            self.file.flush()
+        if self.callback is not None:
+            self.callback(snapshot)
+        return snapshot
+
+    def finish(self, search):
+        """
+        Takes the last snapshot and writes the time series.
+        :return dict of fields for the search result
+        """
+        last = self.snapshot(search)
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        if self.file is not None:
+            self.file.close()
+            self.file = self.writer = None
+        elif self.path is not None:
+            with open(self.path, "w") as f:
+                json.dump(self.snapshots, f, indent=1)
+
+        fields = {"snapshots" : len(self.snapshots)}
+        if last["traced_peak_kb"] is not None:
+            fields["traced_peak_kb"] = last["traced_peak_kb"]
+        return fields
+
+def print_snapshot(snapshot, out=sys.stderr):
+    """callback printing one line per snapshot"""
+    def show(value):
+        return "-" if value is None else "%d" % value
+    print("%8.1fs  expanded %s  %s/s  frontier %s  closed %s  bound %s  rss %s KB  peak %s KB" % (
+        snapshot["time"], show(snapshot["nodes_expanded"]), show(snapshot["nodes_per_second"]),
+        show(snapshot["frontier_size"]), show(snapshot["closed_size"]), show(snapshot["bound"]),
+        show(snapshot["rss_kb"]), show(snapshot["peak_rss_kb"])), file=out)
+
+def profiled(path, function, *args, **kwargs):
+    """
+    Runs function under cProfile, dumps the statistics to path and prints
+    the 20 most expensive calls by internal time to stderr.
+    """
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args, **kwargs)
+    finally:
+        profile.dump_stats(path)
+        pstats.Stats(profile, stream=sys.stderr).sort_stats("tottime").print_stats(20)
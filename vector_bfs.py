@@ -0,0 +1,139 @@
+"""
+Layer-synchronous breadth first search on NumPy arrays.
+
+A whole BFS layer is one uint64 array of packed boards (see
+PuzzleState.encode_config) with parallel arrays of blank indices, parent
+indices and move codes. All successors of a layer come from four
+vectorized blank swaps, one per direction. The sliding puzzle graph is
+bipartite, since every move changes the parity of the blank's position, so
+a new board can only repeat itself within the new layer or appear in the
+layer before the current one. Both are removed with sorted array operations.
+
+Used by the 'vbfs' search mode of puzzle.py, for boards up to 4x4.
+"""
+from PuzzleState import PuzzleState, tile_bits, neighbour_table
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 64 bits hold n*n tiles of tile_bits(n) bits up to 4x4
+MAX_SIZE = 4
+
+#move codes in the order UDLR, see PuzzleState.heap_order
+ACTIONS = ["Up", "Down", "Left", "Right"]
+
+_move_tables = {}
+
+def check_size(n):
+    """raises unless boards of size n can be searched"""
+    if np is None:
+        raise Exception("The vectorized BFS needs numpy : ", "pip install numpy")
+    if n > MAX_SIZE:
+        raise Exception("The vectorized BFS supports boards up to %dx%d : " % (MAX_SIZE, MAX_SIZE), n)
+
+def move_tables(n):
+    """
+    targets[move][blank] is the index the blank moves to, or -1 if the move
+    is not legal. Built once per board size from PuzzleState.neighbour_table.
+    """
+    try:
+        return _move_tables[n]
+    except KeyError:
+        pass
+    targets = np.full((len(ACTIONS), n*n), -1, dtype=np.int64)
+    for blank, moves in enumerate(neighbour_table(n)):
+        for target, action in moves:
+            targets[ACTIONS.index(action), blank] = target
+    _move_tables[n] = targets
+    return targets
+
+
+class Layer(object):
+    """
+        Boards at one depth, in the order a FIFO breadth first search
+        would reach them.
+    """
+    def __init__(self, boards, blanks, parents, moves):
+        """
+        :param boards->ndarray : packed boards, uint64
+        :param blanks->ndarray : index of the blank of every board
+        :param parents->ndarray : index of every board's parent in the previous layer
+        :param moves->ndarray : code of the move from the parent, -1 for the root
+        """
+        self.boards  = boards
+        self.blanks  = blanks
+        self.parents = parents
+        self.moves   = moves
+
+    def __len__(self):
+        return len(self.boards)
+
+def root_layer(state):
+    """layer holding only the board of state"""
+    check_size(state.n)
+    return Layer(np.array([state.board], dtype=np.uint64), np.array([state.blank], dtype=np.int8),
+                 np.array([-1], dtype=np.int32), np.array([PuzzleState.heap_order['Initial']], dtype=np.int8))
+
+def expand_layer(layer, n):
+    """
+    All children of a layer except those undoing their parent's move.
+    :return (boards, blanks, parents, moves) ordered by parent, then UDLR
+    """
+    w = np.uint64(tile_bits(n))
+    mask = np.uint64((1 << tile_bits(n)) - 1)
+    targets = move_tables(n)
+    blanks = layer.blanks.astype(np.int64)
+
+    count = len(layer)
+    children = np.zeros((count, len(ACTIONS)), dtype=np.uint64)
+    child_blanks = np.zeros((count, len(ACTIONS)), dtype=np.int64)
+    valid = np.zeros((count, len(ACTIONS)), dtype=bool)
+
+    for move in range(len(ACTIONS)):
+        target = targets[move][blanks]
+        # Up/Down and Left/Right undo each other: codes 0/1 and 2/3
+        legal = (target >= 0) & (layer.moves != (move ^ 1))
+        target = np.where(legal, target, 0).astype(np.uint64)
+        shift = target*w
+        tile = (layer.boards >> shift) & mask
+        children[:, move] = layer.boards - (tile << shift) + (tile << (blanks.astype(np.uint64)*w))
+        child_blanks[:, move] = target
+        valid[:, move] = legal
+
+    parents, moves = np.nonzero(valid)
+    return children[valid], child_blanks[valid], parents, moves
+
+def next_layer(layer, previous, n):
+    """
+    Layer below layer without duplicates: boards of previous (the layer
+    above) are dropped, and of repeated boards only the first one reached
+    is kept.
+    :param previous->Layer : the layer before layer, None for the root
+    :return (Layer, number of children generated)
+    """
+    boards, blanks, parents, moves = expand_layer(layer, n)
+    generated = len(boards)
+
+    if previous is not None:
+        fresh = ~np.isin(boards, previous.boards)
+        boards, blanks, parents, moves = boards[fresh], blanks[fresh], parents[fresh], moves[fresh]
+
+    # np.unique sorts the boards, the first occurrences are put back in order
+    first = np.unique(boards, return_index=True)[1]
+    first.sort()
+    return Layer(boards[first], blanks[first].astype(np.int8), parents[first].astype(np.int32),
+                 moves[first].astype(np.int8)), generated
+
+def layer_path(layers, index):
+    """
+    Actions from the root to board index of the last layer.
+    :param layers->List : every Layer from the root down
+    """
+    path = []
+    for layer in reversed(layers[1:]):
+        path.append(ACTIONS[layer.moves[index]])
+        index = layer.parents[index]
+    path.reverse()
+    return path